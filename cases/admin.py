@@ -1,21 +1,85 @@
-from django.contrib import admin
-from .models import Case, OfficerNote, NotificationSubscription, AnonymousReport
+from django.contrib import admin, messages
+from .models import (
+    Case, OfficerNote, NotificationSubscription, AnonymousReport, NotificationOutbox, NotificationDelivery,
+    CaseStatusEvent,
+)
+from .search import search_cases
+from .transitions import bulk_transition, save_case
+
+
+def transition_action(status, label):
+    @admin.action(description=f'Move selected cases to {label}', permissions=['change'])
+    def action(modeladmin, request, queryset):
+        events = bulk_transition(queryset, status=status, user=request.user)
+        modeladmin.message_user(
+            request, f'{len(events)} case(s) moved to {label}; subscribers get one digest each.', messages.SUCCESS
+        )
+
+    action.__name__ = f'move_to_{status}'
+    return action
+
 
 @admin.register(Case)
 class CaseAdmin(admin.ModelAdmin):
-    list_display = ('ob_number', 'title', 'status', 'created_at')
+    list_display = ('ob_number', 'title', 'status', 'note_count', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('ob_number', 'title')
+    actions = [transition_action(status, label) for status, label in Case.STATUS_CHOICES]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_note_count()
+
+    def save_model(self, request, obj, form, change):
+        # Edits write only changed columns and record status history
+        if change:
+            save_case(obj, user=request.user)
+        else:
+            super().save_model(request, obj, form, change)
+
+    @admin.display(description='Notes', ordering='note_count')
+    def note_count(self, obj):
+        return obj.note_count
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains scans
+        if not search_term:
+            return queryset, False
+        matches = [result.case.pk for result in search_cases(search_term, limit=500)]
+        return queryset.filter(pk__in=matches), False
 
 @admin.register(OfficerNote)
 class OfficerNoteAdmin(admin.ModelAdmin):
     list_display = ('case', 'created_at')
     list_filter = ('created_at',)
+    list_select_related = ('case',)
+    raw_id_fields = ('case',)
 
 @admin.register(NotificationSubscription)
 class NotificationSubscriptionAdmin(admin.ModelAdmin):
     list_display = ('email', 'case')
+    list_select_related = ('case',)
+    raw_id_fields = ('case',)
 
 @admin.register(AnonymousReport)
 class AnonymousReportAdmin(admin.ModelAdmin):
-    list_display = ('created_at',)
+    list_display = ('created_at', 'duplicate_count', 'last_reported_at')
+    readonly_fields = ('content_hash',)
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'created_at', 'fanned_out_at')
+    list_filter = ('created_at',)
+    raw_id_fields = ('case',)
+
+@admin.register(NotificationDelivery)
+class NotificationDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('email', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    raw_id_fields = ('outbox',)
+
+@admin.register(CaseStatusEvent)
+class CaseStatusEventAdmin(admin.ModelAdmin):
+    list_display = ('case', 'old_status', 'new_status', 'new_court_date', 'changed_by', 'created_at')
+    list_filter = ('new_status', 'created_at')
+    list_select_related = ('case', 'changed_by')
+    raw_id_fields = ('case', 'outbox')
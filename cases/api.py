@@ -0,0 +1,153 @@
+"""
+Read-only JSON API for partner systems.
+
+Rows are read with values() and serialised as plain dicts, so no model
+instances are built. The batch endpoint resolves any number of OB numbers (up
+to API_BATCH_LIMIT) with a single ob_number IN (...) query on the unique
+index. The changes feed walks Case.updated_at with a keyset cursor, so a
+poller that keeps the returned cursor only ever fetches cases changed since
+its last poll. Adding or removing a note touches its case's updated_at, so
+note changes show up in the feed too. Changes younger than SETTLE_DELAY are
+held back: a transaction can commit after a newer updated_at has been served
+(bulk_transition takes its timestamp before its row locks, imports commit
+late), and the cursor would then skip it for good.
+"""
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
+
+from .digests import SETTLE_DELAY
+from .models import Case, OfficerNote
+from .pagination import KeysetPaginator
+
+CASE_FIELDS = ('pk', 'ob_number', 'title', 'status', 'court', 'court_date', 'created_at', 'updated_at')
+NOTE_FIELDS = ('pk', 'case_id', 'note', 'created_at')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def parse_since(value):
+    """An aware datetime for an updated_since value, or None if it does not parse."""
+    # An unencoded '+' in a UTC offset arrives as a space
+    value = value.strip().replace(' ', '+') if 'T' in value else value.strip()
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        return None
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def serialize_cases(rows, include_notes=False):
+    """Add status labels (and notes, with one more query) to values() rows of CASE_FIELDS."""
+    labels = dict(Case.STATUS_CHOICES)
+    for row in rows:
+        row['status_display'] = labels.get(row['status'], row['status'])
+    if include_notes and rows:
+        notes = defaultdict(list)
+        queryset = (
+            OfficerNote.objects.filter(case_id__in=[row['pk'] for row in rows])
+            .order_by('case_id', 'created_at', 'pk')
+            .values(*NOTE_FIELDS)
+        )
+        for note in queryset:
+            notes[note.pop('case_id')].append(note)
+        for row in rows:
+            row['notes'] = notes[row['pk']]
+    return rows
+
+
+def _include_notes(request):
+    return 'notes' in request.GET.get('include', '').split(',')
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def case_batch_view(request):
+    """
+    Look up many cases by OB number: ``?ob=...&ob=...`` or a POST of
+    ``{"ob_numbers": [...]}``. With ``updated_since`` only cases changed
+    after it are returned. Unknown OB numbers are listed under ``not_found``.
+    """
+    if request.method == 'POST':
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            return error('Request body must be JSON.')
+        ob_numbers = payload.get('ob_numbers') if isinstance(payload, dict) else None
+        since_value = payload.get('updated_since') if isinstance(payload, dict) else None
+        if not isinstance(ob_numbers, list) or not all(isinstance(ob, str) for ob in ob_numbers):
+            return error('"ob_numbers" must be a list of strings.')
+    else:
+        ob_numbers = request.GET.getlist('ob')
+        since_value = request.GET.get('updated_since')
+
+    # Keep the caller's order but send each OB number to the database once
+    ob_numbers = list(dict.fromkeys(ob.strip() for ob in ob_numbers if ob.strip()))
+    if not ob_numbers:
+        return error('No OB numbers given.')
+    limit = _setting('API_BATCH_LIMIT', 500)
+    if len(ob_numbers) > limit:
+        return error(f'At most {limit} OB numbers per request.')
+    since = None
+    if since_value:
+        since = parse_since(str(since_value))
+        if since is None:
+            return error('updated_since must be an ISO 8601 date and time.')
+
+    # One query for the whole batch; unchanged rows are dropped here so unknown
+    # OB numbers can still be told apart from unchanged ones
+    rows = {row['ob_number']: row for row in Case.objects.filter(ob_number__in=ob_numbers).values(*CASE_FIELDS)}
+    cases = [rows[ob] for ob in ob_numbers if ob in rows and (since is None or rows[ob]['updated_at'] > since)]
+    return JsonResponse({
+        'cases': serialize_cases(cases, include_notes=_include_notes(request)),
+        'not_found': [ob for ob in ob_numbers if ob not in rows],
+    })
+
+
+@require_GET
+def case_changes_view(request):
+    """
+    Cases in updated_at order, oldest first, ``limit`` at a time, up to
+    SETTLE_DELAY ago. Start with ``updated_since`` (or nothing, for every
+    case) and then pass back the returned ``cursor`` to get only what changed since.
+    """
+    try:
+        limit = int(request.GET.get('limit', _setting('API_PAGE_SIZE', 100)))
+    except ValueError:
+        return error('limit must be a number.')
+    limit = max(1, min(limit, _setting('API_PAGE_SIZE_MAX', 500)))
+
+    queryset = Case.objects.values(*CASE_FIELDS).filter(updated_at__lte=timezone.now() - SETTLE_DELAY)
+    since_value = request.GET.get('updated_since')
+    if since_value:
+        since = parse_since(since_value)
+        if since is None:
+            return error('updated_since must be an ISO 8601 date and time.')
+        queryset = queryset.filter(updated_at__gt=since)
+
+    paginator = KeysetPaginator(queryset, field='updated_at', per_page=limit, descending=False)
+    cursor = request.GET.get('cursor')
+    if cursor and paginator.decode_cursor(cursor) is None:
+        return error('Invalid cursor.')
+    page = paginator.page(after=cursor)
+    rows = list(page)
+    return JsonResponse({
+        'cases': serialize_cases(rows, include_notes=_include_notes(request)),
+        # Always hand back a position, so an empty poll can be repeated as is
+        'cursor': paginator.encode_cursor(rows[-1]) if rows else cursor,
+        'has_more': page.has_next,
+    })
@@ -0,0 +1,133 @@
+"""
+View benchmark harness used by the benchmark_views management command.
+
+Each URL in cases/urls.py is driven through the Django test client against a
+seeded dataset, recording p50/p95 latency, SQL query count and peak memory.
+Results are compared with a stored JSON baseline so regressions fail loudly.
+"""
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Fractional slack allowed over the baseline before a metric counts as a
+# regression, plus an absolute floor so sub-millisecond noise is ignored.
+DEFAULT_TOLERANCE = 0.5
+LATENCY_FLOOR_MS = 2.0
+MEMORY_FLOOR_KB = 256
+
+
+def view_requests(client, case):
+    """The URLs in cases/urls.py as (name, method, path, data) tuples."""
+    list_page = client.get(reverse('case_list')).context['page']
+    return [
+        ('home lookup', 'get', reverse('home'), {'q': case.ob_number}),
+        ('case detail', 'get', reverse('case_detail', args=[case.pk]), None),
+        ('case calendar feed', 'get', reverse('case_calendar_feed', args=[case.pk]), None),
+        ('api batch lookup', 'get', reverse('api_case_batch'), {'ob': [case.ob_number, 'OB/UNKNOWN']}),
+        ('api changes feed', 'get', reverse('api_case_changes'), {'include': 'notes'}),
+        ('subscribe', 'post', reverse('subscribe'), {'ob_number': case.ob_number, 'email': 'new@example.com'}),
+        ('case list', 'get', reverse('case_list'), None),
+        ('case list page 2', 'get', reverse('case_list'), {'after': list_page.next_cursor}),
+        ('case list by status', 'get', reverse('case_list'), {'status': 'court'}),
+        ('court calendar', 'get', reverse('court_calendar'), None),
+        ('case edit form', 'get', reverse('case_edit', args=[case.pk]), None),
+        ('add note form', 'get', reverse('add_note', args=[case.pk]), None),
+        ('dashboard', 'get', reverse('user_dashboard'), None),
+        ('dashboard export', 'get', reverse('export_user_cases'), None),
+        ('officer export', 'get', reverse('export_cases'), {'status': 'court'}),
+        ('officer export gzip', 'get', reverse('export_cases'), {'status': 'court', 'compress': 'gzip'}),
+        ('notification management', 'get', reverse('notification_management'), None),
+    ]
+
+
+def _consume(response):
+    # Streaming responses only do their work while being iterated
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    else:
+        response.content
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(client, method, path, data=None, iterations=20, warmup=2):
+    """Return latency percentiles (ms), query count and peak memory (KB) for one URL."""
+    request = getattr(client, method)
+    for _ in range(warmup):
+        _consume(request(path, data))
+
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            _consume(request(path, data))
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured.captured_queries))
+
+    # Measured separately: tracemalloc slows everything down
+    tracemalloc.start()
+    try:
+        _consume(request(path, data))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(_percentile(timings, 0.95), 3),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Return human-readable regressions of ``results`` against ``baseline``.
+    Query counts must not grow at all; median latency and memory may grow by
+    ``tolerance`` (a fraction) plus a small absolute floor. A view missing
+    from the baseline is reported too, so new views cannot go unchecked.
+    """
+    regressions = []
+    for name, current in results.items():
+        expected = baseline.get(name)
+        if not expected:
+            regressions.append(f"{name}: no baseline entry (re-record with --update-baseline)")
+            continue
+        if current['queries'] > expected['queries']:
+            regressions.append(f"{name}: {current['queries']} queries (baseline {expected['queries']})")
+        limit = expected['p50_ms'] * (1 + tolerance) + LATENCY_FLOOR_MS
+        if current['p50_ms'] > limit:
+            regressions.append(f"{name}: p50 {current['p50_ms']}ms (baseline {expected['p50_ms']}ms)")
+        # Tail latency is noisier, so it gets twice the slack
+        limit = expected['p95_ms'] * (1 + 2 * tolerance) + LATENCY_FLOOR_MS
+        if current['p95_ms'] > limit:
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms (baseline {expected['p95_ms']}ms)")
+        limit = expected['peak_kb'] * (1 + tolerance) + MEMORY_FLOOR_KB
+        if current['peak_kb'] > limit:
+            regressions.append(f"{name}: peak memory {current['peak_kb']}KB (baseline {expected['peak_kb']}KB)")
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results, meta=None):
+    with open(path, 'w') as handle:
+        json.dump({'meta': meta or {}, 'views': results}, handle, indent=2, sort_keys=True)
+        handle.write('\n')
@@ -0,0 +1,260 @@
+"""
+Write buffers that take bulk inserts off the request path.
+
+SubscriptionBuffer: deferred auto-subscription for OB lookups. A logged-in
+user who looks up a case is subscribed to it, but the lookup itself is a
+read: instead of a get_or_create per request, the (case, email) pair is put in an in-process buffer and written later, together with every
+other pair looked up in the meantime, by one bulk_create(ignore_conflicts).
+Pairs known to be subscribed already are kept in a bounded LRU set, so a
+repeat lookup costs no queries at all. The set is kept in step with this
+process's subscription saves and deletes; another process unsubscribing a
+pair is only seen once the pair falls out of the set.
+
+ReportBuffer: anonymous reports are queued and committed in one transaction
+per batch. Exact duplicates (after whitespace normalisation) are folded into
+one row per content hash whose duplicate_count is incremented, so a burst of
+identical submissions costs an INSERT OR IGNORE and an UPDATE per batch.
+
+add() never writes: it runs inside views, some of them async, where the ORM
+may not be called. A buffer is flushed by the first response to finish once
+it holds its size limit or its flush interval has passed, and at exit.
+Reports still queued when a process is killed are lost.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, models, transaction
+from django.db.models import F, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import tracking
+from .models import AnonymousReport, Case, NotificationSubscription, report_hash
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class WriteBuffer:
+    """Pending items plus the size and age rules for flushing them."""
+
+    def __init__(self, max_pending, flush_interval):
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+        self._last_flush = time.monotonic()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def due(self):
+        with self._lock:
+            if not self._pending:
+                return False
+            return len(self._pending) >= self.max_pending or time.monotonic() - self._last_flush >= self.flush_interval
+
+    def _take(self):
+        with self._lock:
+            batch = self._pending
+            self._pending = OrderedDict()
+            self._last_flush = time.monotonic()
+        return batch
+
+
+class SubscriptionBuffer(WriteBuffer):
+    def __init__(self, max_pending=None, flush_interval=None, known_size=None):
+        super().__init__(
+            max_pending or _setting('SUBSCRIPTION_BUFFER_SIZE', 500),
+            flush_interval if flush_interval is not None else _setting('SUBSCRIPTION_FLUSH_INTERVAL', 5),
+        )
+        self.known_size = known_size or _setting('SUBSCRIPTION_KNOWN_CACHE_SIZE', 50000)
+        self._known = OrderedDict()
+
+    def _remember(self, key):
+        # Caller holds the lock
+        self._known[key] = None
+        self._known.move_to_end(key)
+        while len(self._known) > self.known_size:
+            self._known.popitem(last=False)
+
+    def remember(self, case_id, email):
+        with self._lock:
+            self._remember((case_id, email))
+
+    def forget(self, case_id, email):
+        with self._lock:
+            self._known.pop((case_id, email), None)
+
+    def add(self, case_id, email):
+        """
+        Queue a subscription of ``email`` to case ``case_id``. Returns True if
+        it was queued, False if the pair is already subscribed or queued.
+        """
+        key = (case_id, email)
+        with self._lock:
+            if key in self._known:
+                self._known.move_to_end(key)
+                return False
+            if key in self._pending:
+                return False
+            self._pending[key] = None
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._known.clear()
+            self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Write the queued subscriptions. Returns the number of new rows."""
+        batch = list(self._take())
+        if not batch:
+            return 0
+        case_ids = {case_id for case_id, _ in batch}
+        emails = {email for _, email in batch}
+        try:
+            # Reading first keeps the write lock untouched when nothing is new
+            existing = set(
+                NotificationSubscription.objects.filter(case_id__in=case_ids, email__in=emails)
+                .values_list('case_id', 'email')
+            )
+            # Cases deleted since their lookup would fail the whole INSERT
+            live = set(Case.objects.filter(pk__in=case_ids).values_list('pk', flat=True))
+            new = [key for key in batch if key not in existing and key[0] in live]
+            if new:
+                with transaction.atomic():
+                    NotificationSubscription.objects.bulk_create(
+                        [NotificationSubscription(case_id=case_id, email=email) for case_id, email in new],
+                        ignore_conflicts=True,
+                    )
+                    # bulk_create skips the post_save signal that maintains tracking
+                    tracking.subscriptions_added(new)
+        except DatabaseError:
+            # The pairs are dropped and queued again on the next lookup
+            logger.exception("Could not write %d buffered subscription(s)", len(batch))
+            return 0
+        with self._lock:
+            for key in batch:
+                self._remember(key)
+        return len(new)
+
+
+class ReportBuffer(WriteBuffer):
+    def __init__(self, max_pending=None, flush_interval=None, limit=None):
+        super().__init__(
+            max_pending or _setting('REPORT_BUFFER_SIZE', 200),
+            flush_interval if flush_interval is not None else _setting('REPORT_FLUSH_INTERVAL', 2),
+        )
+        # Beyond this many queued reports (e.g. while the database is
+        # unavailable) new ones are refused rather than held in memory
+        self.limit = limit or _setting('REPORT_BUFFER_LIMIT', 10000)
+
+    def add(self, details, now=None):
+        """Queue a report. Returns False if the buffer is full and it was refused."""
+        now = now or timezone.now()
+        key = report_hash(details)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry[1] += 1
+                entry[3] = now
+            elif len(self._pending) >= self.limit:
+                return False
+            else:
+                # [details, count, first seen, last seen]
+                self._pending[key] = [details, 1, now, now]
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Commit the queued reports. Returns the number of submissions written."""
+        batch = self._take()
+        if not batch:
+            return 0
+        items = list(batch.items())
+        try:
+            # All chunks commit together, so a failed batch can be requeued
+            # whole without counting any of its reports twice
+            with transaction.atomic():
+                for start in range(0, len(items), 500):
+                    self._write(items[start:start + 500])
+        except DatabaseError:
+            logger.exception("Could not write %d buffered report(s); requeued", len(batch))
+            self._requeue(batch)
+            return 0
+        return sum(entry[1] for entry in batch.values())
+
+    def _write(self, items):
+        # Insert-if-missing with a zero count, then add the batch's counts:
+        # concurrent writers of the same text never lose a submission
+        AnonymousReport.objects.bulk_create(
+            [
+                AnonymousReport(details=details, content_hash=key, duplicate_count=0, last_reported_at=first)
+                for key, (details, count, first, last) in items
+            ],
+            ignore_conflicts=True,
+        )
+        AnonymousReport.objects.filter(content_hash__in=[key for key, _ in items]).update(
+            duplicate_count=F('duplicate_count') + models.Case(
+                *[When(content_hash=key, then=Value(entry[1])) for key, entry in items], default=Value(0)
+            ),
+            # Rows inserted just above still have a zero count; they are dated
+            # from their first submission rather than from the flush
+            created_at=models.Case(
+                When(duplicate_count=0, then=models.Case(
+                    *[When(content_hash=key, then=Value(entry[2])) for key, entry in items], default=F('created_at')
+                )),
+                default=F('created_at'),
+            ),
+            last_reported_at=Greatest(Coalesce('last_reported_at', 'created_at'), models.Case(
+                *[When(content_hash=key, then=Value(entry[3])) for key, entry in items], default=F('last_reported_at')
+            )),
+        )
+
+    def _requeue(self, batch):
+        with self._lock:
+            for key, entry in batch.items():
+                current = self._pending.get(key)
+                if current is None:
+                    self._pending[key] = entry
+                else:
+                    current[1] += entry[1]
+                    current[2] = min(current[2], entry[2])
+                    current[3] = max(current[3], entry[3])
+
+
+subscriptions = SubscriptionBuffer()
+reports = ReportBuffer()
+
+
+def clear():
+    """Drop everything queued, e.g. after seeding a database that is thrown away."""
+    subscriptions.clear()
+    reports.clear()
+
+
+def flush_if_due(**kwargs):
+    # Runs once the response has been sent, off the request's critical path
+    for buffer in (subscriptions, reports):
+        if buffer.due():
+            buffer.flush()
+
+
+request_finished.connect(flush_if_due, dispatch_uid='cases.buffers.flush_if_due')
+atexit.register(subscriptions.flush)
+atexit.register(reports.flush)
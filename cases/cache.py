@@ -0,0 +1,120 @@
+"""
+Rendered case detail cache.
+
+The case-specific part of case_detail.html is rendered once and cached under
+the case pk plus a version stamp. Signals on Case and OfficerNote replace the
+stamp, so the next view renders afresh. Those signals only reach the cache of
+the process that made the write, so every cached page is also checked against
+the case's updated_at: writes from management commands or other workers are
+picked up on the next view, at the cost of one primary key lookup. The
+per-request parts of the page (CSRF token, navbar, messages) are rendered
+around the cached fragment.
+"""
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from .models import Case
+
+CACHE_ALIAS = 'case_pages'
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(pk):
+    return f'case:{pk}:version'
+
+
+def _page_key(pk, version):
+    return f'case:{pk}:detail:{version}'
+
+
+def _current_version(pk):
+    cache = _cache()
+    version = cache.get(_version_key(pk))
+    if version is None:
+        cache.add(_version_key(pk), uuid.uuid4().hex, timeout=None)
+        version = cache.get(_version_key(pk))
+    return version
+
+
+def _bump(pk):
+    _cache().set(_version_key(pk), uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_case(pk):
+    """
+    Retire the cached page of case ``pk``. The stamp is replaced now and again
+    once the surrounding transaction commits, so a request that reads the
+    pre-commit row cannot leave a stale page under the new stamp.
+    """
+    _bump(pk)
+    transaction.on_commit(partial(_bump, pk))
+
+
+def clear():
+    _cache().clear()
+
+
+def render_case_page(case):
+    notes = list(case.notes.all())
+    history = list(case.events.all())
+    return {
+        'case': {'pk': case.pk, 'ob_number': case.ob_number, 'title': case.title, 'updated_at': case.updated_at},
+        'case_body': render_to_string(
+            'cases/case_detail_body.html', {'case': case, 'notes': notes, 'history': history},
+        ),
+    }
+
+
+def get_case_page(pk):
+    """
+    Return the template context for case ``pk``'s detail page, or None if the
+    case does not exist. Served from the cache when the case is unchanged.
+    """
+    updated_at = Case.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    cache = _cache()
+    version = _current_version(pk)
+    page = cache.get(_page_key(pk, version))
+    if page is None or page['case']['updated_at'] != updated_at:
+        case = Case.objects.with_notes().with_events().filter(pk=pk).first()
+        if case is None:
+            return None
+        page = render_case_page(case)
+        cache.set(_page_key(pk, version), page, timeout=getattr(settings, 'CASE_PAGE_CACHE_TIMEOUT', 86400))
+    return page
+
+
+async def _acurrent_version(pk):
+    cache = _cache()
+    version = await cache.aget(_version_key(pk))
+    if version is None:
+        await cache.aadd(_version_key(pk), uuid.uuid4().hex, timeout=None)
+        version = await cache.aget(_version_key(pk))
+    return version
+
+
+async def aget_case_page(pk):
+    """Async get_case_page(), for the async case detail view."""
+    updated_at = await Case.objects.filter(pk=pk).values_list('updated_at', flat=True).afirst()
+    if updated_at is None:
+        return None
+    cache = _cache()
+    version = await _acurrent_version(pk)
+    page = await cache.aget(_page_key(pk, version))
+    if page is None or page['case']['updated_at'] != updated_at:
+        case = await Case.objects.with_notes().with_events().filter(pk=pk).afirst()
+        if case is None:
+            return None
+        # Notes and history are prefetched, so rendering the fragment runs no queries
+        page = render_case_page(case)
+        await cache.aset(_page_key(pk, version), page, timeout=getattr(settings, 'CASE_PAGE_CACHE_TIMEOUT', 86400))
+    return page
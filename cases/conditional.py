@@ -0,0 +1,56 @@
+"""
+Conditional GET helpers.
+
+Views work out a cheap version of what they are about to render (usually
+one indexed Case.updated_at lookup), turn it into an ETag and Last-Modified
+and answer 304 when the client already has that version.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def page_etag(request, *parts):
+    """
+    ETag for an HTML page. The session and CSRF cookies are folded in because
+    the page embeds the logged-in user's navbar and a CSRF token, and both
+    cookies change on login and logout. Reading cookies costs no queries.
+    """
+    return make_etag(
+        *parts,
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """Add ETag/Last-Modified and make clients revalidate before reusing the response."""
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """
+    A 304 response if the request's validators match, else None. Requests
+    carrying flash messages always get the full page so the messages show.
+    """
+    if request.method not in ('GET', 'HEAD') or CookieStorage.cookie_name in request.COOKIES:
+        return None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
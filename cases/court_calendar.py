@@ -0,0 +1,154 @@
+"""
+Court calendar: hearings by day and court, iCalendar feeds and reminders.
+
+Every query here is a range on Case.court_date (optionally after an equality
+on court), served by the court_date and (court, court_date) indexes. Feeds are
+built from one values_list() query whose rows also give the ETag, so a
+calendar client polling an unchanged feed gets a 304 without any rendering.
+"""
+import hashlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Case, CourtReminder
+from .notifications import queue_case_notification
+
+# Feeds include hearings from this far back, so just-held ones stay visible
+FEED_PAST_DAYS = 30
+# Assumed hearing length for DTEND
+HEARING_DURATION = timedelta(hours=1)
+
+FEED_FIELDS = ('pk', 'ob_number', 'title', 'status', 'court', 'court_date', 'updated_at')
+
+TOKEN_SALT = 'cases.court_calendar'
+
+
+def day_bounds(day):
+    """Aware [start, end) datetimes of ``day`` in the current time zone."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def hearings(start, end, court=None):
+    """Cases with a court date in [start, end), by court and time."""
+    queryset = Case.objects.filter(court_date__gte=start, court_date__lt=end)
+    if court:
+        queryset = queryset.filter(court=court)
+    return queryset.only('pk', 'ob_number', 'title', 'status', 'court', 'court_date').order_by('court', 'court_date', 'pk')
+
+
+def upcoming_hearings(hours, now=None):
+    now = now or timezone.now()
+    return Case.objects.filter(court_date__gt=now, court_date__lte=now + timedelta(hours=hours))
+
+
+def calendar_token(user):
+    return signing.dumps(user.pk, salt=TOKEN_SALT, compress=True)
+
+
+def user_id_for_token(token):
+    try:
+        return signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+
+
+def feed_rows(queryset, now=None):
+    """The (FEED_FIELDS) rows of ``queryset``'s recent and upcoming hearings."""
+    now = now or timezone.now()
+    return list(
+        queryset.filter(court_date__gte=now - timedelta(days=FEED_PAST_DAYS))
+        .order_by('court_date', 'pk')
+        .values_list(*FEED_FIELDS)
+    )
+
+
+def feed_etag(rows):
+    digest = hashlib.sha1(repr(rows).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line):
+    # RFC 5545 lines are at most 75 octets; continuation lines start with a space
+    data = line.encode()
+    if len(data) <= 75:
+        return line
+    parts = []
+    while data:
+        size = 75 if not parts else 74
+        # Do not split a multi-byte character
+        while size < len(data) and (data[size] & 0xC0) == 0x80:
+            size -= 1
+        parts.append(data[:size].decode())
+        data = data[size:]
+    return '\r\n '.join(parts)
+
+
+def _stamp(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def render_ics(name, rows, domain='hakiflow'):
+    """An iCalendar document with one event per hearing row."""
+    labels = dict(Case.STATUS_CHOICES)
+    now = _stamp(timezone.now())
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//HakiFlow//Court Calendar//EN',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_escape(name)}',
+    ]
+    for pk, ob_number, title, status, court, court_date, updated_at in rows:
+        lines += [
+            'BEGIN:VEVENT',
+            # Stable per hearing, so a moved date replaces the old event
+            f'UID:case-{pk}@{domain}',
+            f'DTSTAMP:{now}',
+            f'LAST-MODIFIED:{_stamp(updated_at)}',
+            f'DTSTART:{_stamp(court_date)}',
+            f'DTEND:{_stamp(court_date + HEARING_DURATION)}',
+            f'SUMMARY:{_escape(f"{ob_number} hearing - {title}")}',
+            f'DESCRIPTION:{_escape(f"Case {ob_number} ({labels.get(status, status)})")}',
+        ]
+        if court:
+            lines.append(f'LOCATION:{_escape(court)}')
+        lines.append('END:VEVENT')
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
+
+
+def queue_court_reminders(hours=24, now=None):
+    """
+    Queue a notification for every hearing in the next ``hours`` that has not
+    been announced yet. Returns the number of reminders queued.
+    """
+    now = now or timezone.now()
+    due = (
+        upcoming_hearings(hours, now)
+        .exclude(court_reminders__court_date=F('court_date'))
+        .only('pk', 'ob_number', 'title', 'court', 'court_date')
+    )
+    queued = 0
+    for case in due.iterator():
+        with transaction.atomic():
+            _, created = CourtReminder.objects.get_or_create(case=case, court_date=case.court_date)
+            if not created:
+                continue
+            when = timezone.localtime(case.court_date).strftime('%d %b %Y at %H:%M')
+            where = f" at {case.court}" if case.court else ''
+            queue_case_notification(
+                case,
+                f"HakiFlow: {case.ob_number} hearing on {timezone.localtime(case.court_date):%d %b}",
+                f"Reminder: case {case.ob_number} - {case.title} is scheduled for a hearing on {when}{where}.",
+            )
+        queued += 1
+    return queued
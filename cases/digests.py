@@ -0,0 +1,129 @@
+"""
+Periodic notification digests.
+
+Subscribers who chose an hourly, daily or weekly frequency are skipped by the
+immediate fan-out. Instead, send_digests reads every case update queued in
+the outbox since the frequency's DigestCursor, groups the updates per email
+address across all of that address's subscriptions, and queues one delivery
+per address. The deliveries are then sent by the normal outbox worker.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import CaseStatusEvent, DigestCursor, NotificationDelivery, NotificationOutbox, NotificationSubscription
+from .notifications import describe_event
+
+PERIODS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+    'weekly': timedelta(days=7),
+}
+
+# Outbox rows younger than this are left for the next run, so a transaction
+# that committed a lower id late is not skipped by the cursor
+SETTLE_DELAY = timedelta(seconds=30)
+
+# Updates listed per case before the rest are summarised
+MAX_UPDATES_PER_CASE = 10
+
+
+def _window_updates(window):
+    """Cases updated by the outbox rows in ``window`` and their (time, text) updates, by case id."""
+    updates = defaultdict(list)
+    cases = {}
+    for outbox in window.filter(case__isnull=False).select_related('case').order_by('pk'):
+        cases[outbox.case_id] = outbox.case
+        updates[outbox.case_id].append((outbox.created_at, outbox.body))
+    events = CaseStatusEvent.objects.filter(outbox__in=window.filter(case__isnull=True)).select_related('case')
+    for event in events.order_by('pk'):
+        cases[event.case_id] = event.case
+        updates[event.case_id].append((event.created_at, describe_event(event)))
+    return cases, updates
+
+
+def _digest_body(frequency, since, case_ids, cases, updates):
+    lines = [f"Updates on your cases since {since:%Y-%m-%d %H:%M} UTC:"]
+    for case_id in sorted(case_ids, key=lambda pk: cases[pk].ob_number):
+        case = cases[case_id]
+        items = updates[case_id]
+        lines += ['', f"{case.ob_number} - {case.title}"]
+        for created_at, text in items[-MAX_UPDATES_PER_CASE:]:
+            text = text.replace('\n', '\n    ')
+            lines.append(f"  {created_at:%Y-%m-%d %H:%M}  {text}")
+        if len(items) > MAX_UPDATES_PER_CASE:
+            lines.append(f"  ... and {len(items) - MAX_UPDATES_PER_CASE} earlier update(s)")
+    lines += ['', f"You receive {frequency} digests. Change this under Manage Notifications."]
+    return '\n'.join(lines)
+
+
+def build_digest(frequency, now=None, force=False, chunk_size=None):
+    """
+    Queue one digest delivery per subscriber of ``frequency`` covering the
+    updates since the last run. Returns the number of deliveries queued, or
+    None if the period has not elapsed yet (unless ``force``).
+    """
+    period = PERIODS[frequency]
+    now = now or timezone.now()
+    chunk_size = chunk_size or getattr(settings, 'NOTIFICATION_FANOUT_CHUNK_SIZE', 1000)
+    updates_log = NotificationOutbox.objects.filter(digest_frequency='')
+
+    with transaction.atomic():
+        cursor, created = DigestCursor.objects.select_for_update().get_or_create(frequency=frequency)
+        if created:
+            # First run: start from one period ago rather than from the beginning
+            start = updates_log.filter(created_at__lte=now - period).aggregate(last=Max('pk'))['last'] or 0
+            cursor.last_outbox_id = start
+        elif not force and cursor.last_run_at and now - cursor.last_run_at < period:
+            return None
+
+        upper = updates_log.filter(created_at__lte=now - SETTLE_DELAY).aggregate(last=Max('pk'))['last']
+        upper = max(upper or 0, cursor.last_outbox_id)
+        since = cursor.last_run_at or now - period
+        window = updates_log.filter(pk__gt=cursor.last_outbox_id, pk__lte=upper)
+        cases, updates = _window_updates(window)
+
+        queued = 0
+        if updates:
+            run = NotificationOutbox.objects.create(
+                subject=f'HakiFlow: your {frequency} case digest',
+                body='',
+                digest_frequency=frequency,
+                fanned_out_at=now,
+            )
+            touched = Q(case_id__in=window.values('case_id')) | Q(
+                case_id__in=CaseStatusEvent.objects.filter(outbox__in=window).values('case_id')
+            )
+            subscriptions = (
+                NotificationSubscription.objects.filter(touched, frequency=frequency)
+                .order_by('email')
+                .values_list('email', 'case_id')
+                .iterator(chunk_size=chunk_size)
+            )
+            batch = []
+            for email, rows in groupby(subscriptions, key=itemgetter(0)):
+                case_ids = [case_id for _, case_id in rows]
+                batch.append(NotificationDelivery(
+                    outbox=run,
+                    email=email,
+                    subject=f'HakiFlow: updates on {len(case_ids)} of your cases ({frequency} digest)',
+                    body=_digest_body(frequency, since, case_ids, cases, updates),
+                    next_attempt_at=now,
+                ))
+                if len(batch) >= chunk_size:
+                    NotificationDelivery.objects.bulk_create(batch)
+                    queued += len(batch)
+                    batch = []
+            NotificationDelivery.objects.bulk_create(batch)
+            queued += len(batch)
+
+        cursor.last_outbox_id = upper
+        cursor.last_run_at = now
+        cursor.save()
+    return queued
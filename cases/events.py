@@ -0,0 +1,195 @@
+"""
+Live case events over Server-Sent Events.
+
+Views publish status changes and new notes to an in-process bus once their
+transaction commits. Each open event stream is an asyncio queue on the ASGI
+event loop, subscribed to the channels (case pks) it follows, so an idle
+connection costs no database queries and no thread; thousands of them fit in
+one worker. A short history lets a reconnecting client catch up from its
+Last-Event-ID.
+
+The bus lives in one process: run a single ASGI worker for streams, or a
+client only hears about changes made through the worker it is connected to.
+Under WSGI Django buffers an async stream until it ends, so pages only open
+one (and the stream views only serve one) when the request came over ASGI.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+from functools import partial
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def streaming_supported(request):
+    return isinstance(request, ASGIRequest)
+
+
+class Event:
+    def __init__(self, id, channel, kind, data):
+        self.id = id
+        self.channel = channel
+        self.kind = kind
+        self.data = data
+
+    def encode(self):
+        payload = json.dumps(self.data, cls=DjangoJSONEncoder)
+        return f"id: {self.id}\nevent: {self.kind}\ndata: {payload}\n\n"
+
+
+class Subscriber:
+    """One open stream: a bounded queue fed on its own event loop."""
+
+    def __init__(self, channels, loop, maxsize):
+        self.channels = frozenset(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        # Set when the client fell too far behind and missed events
+        self.overflowed = False
+
+    def _put(self, event):
+        # Runs on the subscriber's loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The full queue wakes the stream, which then sees the flag
+            self.overflowed = True
+
+    def deliver(self, event):
+        # Safe to call from any thread
+        self.loop.call_soon_threadsafe(self._put, event)
+
+
+class EventBus:
+    def __init__(self, history=None):
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=history or _setting('EVENT_STREAM_HISTORY', 500))
+
+    def subscribe(self, channels, loop=None):
+        subscriber = Subscriber(
+            channels,
+            loop or asyncio.get_running_loop(),
+            _setting('EVENT_STREAM_QUEUE_SIZE', 100),
+        )
+        with self._lock:
+            for channel in subscriber.channels:
+                self._channels.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            for channel in subscriber.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({subscriber for subscribers in self._channels.values() for subscriber in subscribers})
+
+    def publish(self, channel, kind, data):
+        """Send an event to every stream following ``channel``. Returns the event."""
+        with self._lock:
+            event = Event(next(self._ids), channel, kind, data)
+            self._history.append(event)
+            subscribers = list(self._channels.get(channel, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.deliver(event)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(subscriber)
+        return event
+
+    def since(self, last_id, channels):
+        """
+        Buffered events after ``last_id`` on ``channels``, or None if the
+        history no longer reaches back that far (or the id is from before a
+        restart) and the client should reload instead.
+        """
+        with self._lock:
+            history = list(self._history)
+            latest = self._history[-1].id if self._history else 0
+        if last_id > latest or (history and last_id < history[0].id - 1):
+            return None
+        return [event for event in history if event.id > last_id and event.channel in channels]
+
+
+bus = EventBus()
+
+
+def publish_case_event(case, kind, data):
+    """Publish ``kind`` for ``case`` once the current transaction commits."""
+    data = {'case': case.pk, 'ob_number': case.ob_number, **data}
+    transaction.on_commit(partial(bus.publish, case.pk, kind, data))
+
+
+def publish_status_change(case):
+    publish_case_event(case, 'status', {
+        'status': case.status,
+        'status_display': case.get_status_display(),
+        'court_date': case.court_date,
+        'updated_at': case.updated_at or timezone.now(),
+    })
+
+
+def publish_note(note):
+    publish_case_event(note.case, 'note', {'note': note.note, 'created_at': note.created_at})
+
+
+async def stream(channels, last_event_id=None):
+    """
+    The text/event-stream body for ``channels``: replayed history, live
+    events and keep-alive comments. Ends after EVENT_STREAM_MAX_AGE seconds
+    (the browser reconnects) or with a ``resync`` event when the client has
+    missed events and should reload.
+    """
+    heartbeat = _setting('EVENT_STREAM_HEARTBEAT', 15)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _setting('EVENT_STREAM_MAX_AGE', 300)
+    subscriber = bus.subscribe(channels)
+    # Subscribed before reading the history, so nothing falls in between;
+    # events seen in both are sent once
+    sent = last_event_id or 0
+    try:
+        yield f"retry: {_setting('EVENT_STREAM_RETRY', 3000)}\n\n"
+        if last_event_id is not None:
+            missed = bus.since(last_event_id, subscriber.channels)
+            if missed is None:
+                yield "event: resync\ndata: {}\n\n"
+                return
+            for event in missed:
+                sent = event.id
+                yield event.encode()
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if subscriber.overflowed:
+                yield "event: resync\ndata: {}\n\n"
+                return
+            if event.id > sent:
+                sent = event.id
+                yield event.encode()
+    finally:
+        bus.unsubscribe(subscriber)
@@ -0,0 +1,280 @@
+"""
+Bulk case import from CSV or JSON Lines files.
+
+Rows are read lazily and cleaned with the Case model fields' own validation
+(required fields, status choices, date parsing). Each batch is then written in
+its own transaction with one bulk_create(update_conflicts=True) keyed on the
+OB number: new OB numbers are inserted and known ones updated in place. Only
+the columns present in a row are written to an existing case; new cases take
+the field defaults for the rest. Bad rows are reported by line number without
+stopping the import, and a later row for an OB number replaces an earlier one.
+A checkpoint
+records the last committed line so an interrupted import can be resumed.
+"""
+import csv
+import json
+import os
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Case
+from .signals import bulk_cases_changed
+from .synthetic import bulk_create_with_timestamps
+
+IMPORT_FIELDS = ('ob_number', 'title', 'description', 'status', 'court_date', 'court', 'id_number', 'created_at')
+# Columns overwritten when an OB number already exists, if the row has them;
+# the reported date is kept
+UPDATE_FIELDS = ('title', 'description', 'status', 'court_date', 'court', 'id_number', 'updated_at')
+
+# Above this many imported cases the derived tables are rebuilt wholesale
+# instead of case by case
+FULL_REBUILD_THRESHOLD = 20000
+
+STATUS_LABELS = {label.lower(): value for value, label in Case.STATUS_CHOICES}
+
+
+class RowError:
+    def __init__(self, line, ob_number, message):
+        self.line = line
+        self.ob_number = ob_number
+        self.message = message
+
+    def __str__(self):
+        return f"line {self.line} ({self.ob_number or 'no OB number'}): {self.message}"
+
+
+class ImportResult:
+    def __init__(self, created=0, updated=0, error_count=0, last_line=0):
+        self.created = created
+        self.updated = updated
+        self.error_count = error_count
+        self.last_line = last_line
+        self.errors = []
+        self.case_ids = []
+
+    def add_error(self, error):
+        self.errors.append(error)
+        self.error_count += 1
+
+    def state(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'last_line': self.last_line,
+        }
+
+
+def detect_format(name):
+    return 'jsonl' if name.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def _column(name):
+    # "OB Number" (as in the export header) and "ob_number" both map to
+    # ob_number. The export has no description column, so a re-imported export
+    # can update known cases but its new OB numbers are rejected.
+    return name.strip().lower().replace(' ', '_') if name else name
+
+
+def read_rows(stream, format='csv'):
+    """Yield ``(line, row, error)`` for every record in a text stream."""
+    if format == 'jsonl':
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as exc:
+                yield line, None, f'invalid JSON: {exc}'
+                continue
+            if isinstance(row, dict):
+                yield line, {_column(key): value for key, value in row.items()}, None
+            else:
+                yield line, None, 'expected a JSON object'
+        return
+
+    reader = csv.DictReader(stream)
+    reader.fieldnames = [_column(name) for name in reader.fieldnames or []]
+    for row in reader:
+        yield reader.line_num, row, None
+
+
+def _clean_value(name, value):
+    field = Case._meta.get_field(name)
+    if isinstance(value, str):
+        value = value.strip()
+    if value in (None, ''):
+        value = field.get_default() if field.has_default() else (None if field.null else '')
+    elif name == 'status':
+        value = STATUS_LABELS.get(str(value).lower(), value)
+    value = field.clean(value, None)
+    if isinstance(value, datetime) and timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _clean(row, names):
+    data = {}
+    errors = []
+    for name in names:
+        value = row.get(name)
+        if name == 'created_at' and value in (None, ''):
+            continue
+        try:
+            data[name] = _clean_value(name, value)
+        except ValidationError as exc:
+            errors.append(f"{name}: {' '.join(exc.messages)}")
+    if errors:
+        raise ValidationError(errors)
+    return data
+
+
+def clean_row(row):
+    """
+    Return the Case field values of the columns present in ``row`` or raise
+    ValidationError. Missing columns are left out so that updating a known
+    case never overwrites them; complete_row() fills them in for new cases.
+    """
+    return _clean(row, [name for name in IMPORT_FIELDS if name == 'ob_number' or name in row])
+
+
+def complete_row(data):
+    """Add the defaults of the columns a new case's row left out, or raise ValidationError."""
+    return {**_clean({}, [name for name in IMPORT_FIELDS if name not in data]), **data}
+
+
+class Checkpoint:
+    """Progress of one import file, saved after every committed batch."""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+
+    def fingerprint(self):
+        stat = os.stat(self.source)
+        return {'source': os.path.abspath(self.source), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def load(self):
+        """The saved state, or None. Raises ValueError if the file changed since."""
+        try:
+            with open(self.path) as handle:
+                state = json.load(handle)
+        except FileNotFoundError:
+            return None
+        if state.pop('file', None) != self.fingerprint():
+            raise ValueError(f'{self.source} changed since the checkpoint in {self.path} was written')
+        return state
+
+    def save(self, result):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump({'file': self.fingerprint(), **result.state()}, handle)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class CaseImporter:
+    def __init__(self, batch_size=2000, update_existing=True, checkpoint=None, stdout=None):
+        self.batch_size = batch_size
+        self.update_existing = update_existing
+        self.checkpoint = checkpoint
+        self.stdout = stdout
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def run(self, rows, resume=None):
+        """
+        Import ``rows`` from read_rows(). ``resume`` is a saved checkpoint
+        state; lines it already committed are skipped.
+        """
+        result = ImportResult(**resume) if resume else ImportResult()
+        skip_through = result.last_line
+        batch = []
+        line = skip_through
+        for line, row, error in rows:
+            if line <= skip_through:
+                continue
+            if error:
+                result.add_error(RowError(line, None, error))
+                continue
+            try:
+                batch.append((line, clean_row(row)))
+            except ValidationError as exc:
+                result.add_error(RowError(line, row.get('ob_number'), '; '.join(exc.messages)))
+            if len(batch) >= self.batch_size:
+                self.write(batch, result, line)
+                batch = []
+        self.write(batch, result, line)
+
+        # bulk_create bypasses model signals. A resumed import cannot tell
+        # which cases earlier runs touched, so it rebuilds everything.
+        if resume or len(result.case_ids) > FULL_REBUILD_THRESHOLD:
+            bulk_cases_changed.send(sender=Case, case_ids=None)
+        elif result.case_ids:
+            bulk_cases_changed.send(sender=Case, case_ids=result.case_ids)
+        if self.checkpoint:
+            self.checkpoint.clear()
+        return result
+
+    def write(self, batch, result, last_line):
+        # A later row for the same OB number wins, within a batch as across them
+        latest = {}
+        for line, data in batch:
+            latest[data['ob_number']] = (line, data)
+        lines = {ob_number: line for ob_number, (line, _) in latest.items()}
+
+        cases = []
+        with transaction.atomic():
+            existing = set(Case.objects.filter(ob_number__in=lines).values_list('ob_number', flat=True))
+            # Rows are upserted in groups that write the same columns
+            groups = {}
+            for ob_number, (line, data) in latest.items():
+                if ob_number in existing:
+                    if not self.update_existing:
+                        result.add_error(RowError(line, ob_number, 'OB number already exists'))
+                        continue
+                    data = {name: value for name, value in data.items() if name != 'created_at'}
+                else:
+                    try:
+                        data = complete_row(data)
+                    except ValidationError as exc:
+                        result.add_error(RowError(line, ob_number, '; '.join(exc.messages)))
+                        continue
+                fields = tuple(name for name in UPDATE_FIELDS if name in data or name == 'updated_at')
+                groups.setdefault(fields, []).append(Case(**data))
+            for fields, group in groups.items():
+                bulk_create_with_timestamps(
+                    Case,
+                    group,
+                    ['created_at'],
+                    update_conflicts=True,
+                    unique_fields=['ob_number'],
+                    update_fields=fields,
+                )
+                cases.extend(group)
+
+        if any(case.pk is None for case in cases):
+            # Backends that cannot return ids from an upsert
+            result.case_ids.extend(
+                Case.objects.filter(ob_number__in=[case.ob_number for case in cases]).values_list('pk', flat=True)
+            )
+        else:
+            result.case_ids.extend(case.pk for case in cases)
+        updated = sum(case.ob_number in existing for case in cases)
+        result.updated += updated
+        result.created += len(cases) - updated
+        result.last_line = last_line
+        if self.checkpoint:
+            self.checkpoint.save(result)
+        if cases:
+            self.log(f'  line {last_line}: {result.created} created, {result.updated} updated, {result.error_count} errors')
@@ -0,0 +1,102 @@
+"""
+Throughput comparison of the public lookup path under WSGI and ASGI.
+
+The same request mix is driven for a fixed time through Django's handler
+stack twice in one process: by a pool of threads calling the synchronous
+handler (what a threaded WSGI server does) and by coroutines on one event
+loop calling the ASGI handler (what a single uvicorn/daphne worker does).
+Both run in-process, so the numbers compare request handling, not the
+network or a particular server.
+"""
+import asyncio
+import itertools
+import statistics
+import threading
+import time
+
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+
+def lookup_requests(cases, emails):
+    """The public lookup mix as (method, path, data) tuples, cycling through ``cases``."""
+    requests = []
+    for case, email in zip(cases, itertools.cycle(emails)):
+        requests += [
+            ('get', reverse('home'), {'q': case.ob_number}),
+            ('get', reverse('case_detail', args=[case.pk]), None),
+            ('post', reverse('subscribe'), {'ob_number': case.ob_number, 'email': email}),
+        ]
+    return requests
+
+
+def _summary(latencies, errors, elapsed):
+    ordered = sorted(latencies) or [0]
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(ordered) * 1000, 2),
+        'p95_ms': round(ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))] * 1000, 2),
+    }
+
+
+def run_wsgi(requests, concurrency=8, duration=10.0):
+    """Drive ``requests`` from ``concurrency`` threads through the sync handler."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(offset):
+        client = Client(raise_request_exception=False)
+        mine = []
+        failed = 0
+        try:
+            for method, path, data in itertools.islice(itertools.cycle(requests), offset, None):
+                if time.perf_counter() >= deadline:
+                    break
+                started = time.perf_counter()
+                response = getattr(client, method)(path, data)
+                mine.append(time.perf_counter() - started)
+                failed += response.status_code >= 500
+        finally:
+            connections.close_all()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _summary(latencies, errors[0], time.perf_counter() - started)
+
+
+async def _run_asgi(requests, concurrency, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset):
+        nonlocal errors
+        client = AsyncClient(raise_request_exception=False)
+        for method, path, data in itertools.islice(itertools.cycle(requests), offset, None):
+            if time.perf_counter() >= deadline:
+                break
+            started = time.perf_counter()
+            response = await getattr(client, method)(path, data)
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code >= 500
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return _summary(latencies, errors, time.perf_counter() - started)
+
+
+def run_asgi(requests, concurrency=8, duration=10.0):
+    """Drive ``requests`` from ``concurrency`` coroutines on one event loop through the ASGI handler."""
+    return asyncio.run(_run_asgi(requests, concurrency, duration))
@@ -0,0 +1,313 @@
+"""
+OB-number resolution with positive and negative caching.
+
+Most public lookups are for OB numbers that do not exist (typos and bots).
+ObNumberLookup answers those from a Bloom filter of every stored OB number
+without touching the database. The filter is built by a background thread
+started when each web process loads (hakiflow/wsgi.py and asgi.py), never
+inside a request: until it is ready, lookups simply ask the database. Numbers
+the filter may contain are answered from an LRU map of ob_number to pk, and
+only misses there reach the database; the rare Bloom false positives are
+remembered in a small negative LRU.
+
+Case signals keep the structures in step with this process's writes. Cases
+created or renumbered by other processes are picked up by an incremental
+query on the indexed updated_at, at most every OB_LOOKUP_REFRESH_INTERVAL
+seconds, so a new OB number may be reported missing for that long by another
+worker. Each refresh reaches OB_LOOKUP_REFRESH_OVERLAP seconds behind the
+previous one, for transactions that commit after they stamp their rows. Deletes
+leave stale bits in the filter, which only cost a database check; once the
+filter has grown past its capacity a replacement is built in the background
+while the old one stays in use. Writes made during a build are journalled
+and added to the new filter before it is swapped in.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Case
+
+logger = logging.getLogger(__name__)
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter over strings, using double hashing."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class LRU:
+    def __init__(self, size, on_evict=None):
+        self.size = size
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.size:
+            evicted = self._data.popitem(last=False)
+            if self.on_evict:
+                self.on_evict(*evicted)
+
+    def pop(self, key):
+        return self._data.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+
+class ObNumberLookup:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # _by_pk mirrors _hits so a renamed case's old number can be dropped
+        self._by_pk = {}
+        self._hits = LRU(_setting('OB_LOOKUP_CACHE_SIZE', 20000), on_evict=lambda ob, pk: self._by_pk.pop(pk, None))
+        self._misses = LRU(_setting('OB_LOOKUP_NEGATIVE_CACHE_SIZE', 5000))
+        self._filter = None
+        # Cases updated since then are read by the next refresh()
+        self._updated_since = None
+        self._refreshed_at = 0.0
+        # OB numbers written while a build runs, or None when none is running
+        self._journal = None
+        # Bumped by reset() so a build started before it is thrown away
+        self._generation = 0
+        self._warming = False
+
+    # Building and refreshing
+
+    def rebuild(self):
+        """Build the filter from every stored OB number, in this thread."""
+        with self._lock:
+            generation = self._generation
+            self._journal = []
+        started = timezone.now()
+        count = Case.objects.count()
+        bloom = BloomFilter(
+            max(count * 2, _setting('OB_LOOKUP_MIN_CAPACITY', 10000)),
+            _setting('OB_LOOKUP_ERROR_RATE', 0.01),
+        )
+        for ob_number in Case.objects.values_list('ob_number', flat=True).order_by().iterator(chunk_size=5000):
+            bloom.add(ob_number)
+        with self._lock:
+            if generation != self._generation:
+                return
+            for ob_number in self._journal:
+                bloom.add(ob_number)
+            self._journal = None
+            self._filter = bloom
+            self._updated_since = started
+            self._refreshed_at = time.monotonic()
+            self._misses.clear()
+
+    def warm(self):
+        """Build the filter in a background thread, unless one is already building."""
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+        threading.Thread(target=self._warm, name='ob-number-lookup', daemon=True).start()
+
+    def _warm(self):
+        try:
+            self.rebuild()
+        except Exception:
+            # Lookups keep going to the database; the next capacity check retries
+            logger.exception("Could not build the OB number filter")
+        finally:
+            with self._lock:
+                self._warming = False
+            connection.close()
+
+    def reset(self):
+        """Drop everything; lookups ask the database until the next build."""
+        with self._lock:
+            self._generation += 1
+            self._journal = None
+            self._filter = None
+            self._hits.clear()
+            self._by_pk.clear()
+            self._misses.clear()
+
+    def _stale(self):
+        with self._lock:
+            if self._filter is None:
+                return None
+            if self._filter.count > self._filter.capacity:
+                return 'rebuild'
+            if time.monotonic() - self._refreshed_at >= _setting('OB_LOOKUP_REFRESH_INTERVAL', 10):
+                return 'refresh'
+        return None
+
+    def refresh(self):
+        """Add cases created or renumbered since the last build or refresh, e.g. by other processes."""
+        with self._lock:
+            since = self._updated_since
+        if since is None:
+            return
+        started = timezone.now()
+        since -= timedelta(seconds=_setting('OB_LOOKUP_REFRESH_OVERLAP', 60))
+        rows = list(Case.objects.filter(updated_at__gte=since).values_list('pk', 'ob_number'))
+        with self._lock:
+            for pk, ob_number in rows:
+                self._add(pk, ob_number, cache=False)
+            self._updated_since = started
+            self._refreshed_at = time.monotonic()
+
+    def _prepare(self):
+        state = self._stale()
+        if state == 'rebuild':
+            # The full filter still answers correctly (just with more false
+            # positives) while its replacement is built
+            self.warm()
+        elif state == 'refresh':
+            self.refresh()
+
+    # Keeping in step with writes
+
+    def _add(self, pk, ob_number, cache=True):
+        # Caller holds the lock
+        previous = self._by_pk.get(pk)
+        if previous is not None and previous != ob_number:
+            self._hits.pop(previous)
+            del self._by_pk[pk]
+        # Numbers already present (e.g. re-read by an overlapping refresh)
+        # must not count towards the filter's capacity again
+        if self._filter is not None and ob_number not in self._filter:
+            self._filter.add(ob_number)
+        if self._journal is not None:
+            self._journal.append(ob_number)
+        self._misses.pop(ob_number)
+        if cache:
+            self._hits.set(ob_number, pk)
+            self._by_pk[pk] = ob_number
+
+    def case_saved(self, pk, ob_number):
+        with self._lock:
+            self._add(pk, ob_number)
+
+    def case_deleted(self, pk, ob_number):
+        with self._lock:
+            self._hits.pop(self._by_pk.pop(pk, ob_number))
+            self._hits.pop(ob_number)
+
+    def cases_changed(self, case_ids):
+        """Take in OB numbers written in bulk; None means too many to list."""
+        with self._lock:
+            if self._filter is None and self._journal is None and not len(self._hits):
+                return
+        if case_ids is None:
+            self.reset()
+            return
+        for start in range(0, len(case_ids), 500):
+            rows = Case.objects.filter(pk__in=case_ids[start:start + 500]).values_list('pk', 'ob_number')
+            with self._lock:
+                for pk, ob_number in rows:
+                    self._add(pk, ob_number, cache=False)
+
+    # Lookups
+
+    def _cached(self, ob_number):
+        """(known, pk): known is False when the database must be asked."""
+        with self._lock:
+            if self._filter is not None and (ob_number not in self._filter or ob_number in self._misses):
+                return True, None
+            pk = self._hits.get(ob_number)
+            return pk is not None, pk
+
+    def _remember(self, ob_number, pk):
+        with self._lock:
+            if pk is None:
+                # Misses are only trusted next to a filter, which refresh() keeps current
+                if self._filter is not None:
+                    self._misses.set(ob_number, True)
+            else:
+                self._hits.set(ob_number, pk)
+                self._by_pk[pk] = ob_number
+
+    def resolve(self, ob_number):
+        """The pk of the case with ``ob_number``, or None."""
+        if not ob_number:
+            return None
+        self._prepare()
+        known, pk = self._cached(ob_number)
+        if not known:
+            pk = Case.objects.filter(ob_number=ob_number).values_list('pk', flat=True).first()
+            self._remember(ob_number, pk)
+        return pk
+
+    async def aresolve(self, ob_number):
+        if not ob_number:
+            return None
+        if self._stale():
+            await sync_to_async(self._prepare)()
+        known, pk = self._cached(ob_number)
+        if not known:
+            pk = await Case.objects.filter(ob_number=ob_number).values_list('pk', flat=True).afirst()
+            self._remember(ob_number, pk)
+        return pk
+
+    def discard(self, ob_number):
+        """Forget a cached answer found to be wrong."""
+        with self._lock:
+            pk = self._hits.pop(ob_number)
+            self._by_pk.pop(pk, None)
+            self._misses.pop(ob_number)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'built': self._filter is not None,
+                'filter_count': self._filter.count if self._filter else 0,
+                'filter_bytes': len(self._filter.bits) if self._filter else 0,
+                'cached_hits': len(self._hits),
+                'cached_misses': len(self._misses),
+            }
+
+
+ob_numbers = ObNumberLookup()
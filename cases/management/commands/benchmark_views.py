@@ -0,0 +1,96 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from cases import buffers
+from cases.benchmark import DEFAULT_TOLERANCE, compare, load_baseline, measure, save_baseline, view_requests
+from cases.lookup import ob_numbers
+from cases.models import Case, CitizenProfile
+from cases.synthetic import citizen_id_number, generate, subscriber_email
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'views_baseline.json')
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway test database, drives every view through the test client and '
+        'reports p50/p95 latency, SQL query count and peak memory, failing on regressions '
+        'against the stored JSON baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=20000, help='Synthetic cases to seed')
+        parser.add_argument('--notes-per-case', type=int, default=5)
+        parser.add_argument('--subscribers', type=int, default=20000)
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per view')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+        parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                            help='Allowed fractional latency/memory growth over the baseline')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Every view is hit many times from one address
+            with override_settings(RATELIMIT_ENABLED=False):
+                results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            # Nothing queued or cached for the seeded rows may outlive them
+            buffers.clear()
+            ob_numbers.reset()
+
+        self.report(results)
+        meta = {key: options[key] for key in ('cases', 'notes_per_case', 'subscribers', 'iterations')}
+        if options['update_baseline']:
+            save_baseline(options['baseline'], results, meta)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        baseline = load_baseline(options['baseline'])
+        if baseline is None:
+            self.stdout.write(self.style.WARNING('No baseline found; run with --update-baseline to record one'))
+            return
+        if baseline.get('meta') and baseline['meta'] != meta:
+            self.stdout.write(self.style.WARNING(f"Baseline was recorded with {baseline['meta']}; comparing anyway"))
+        regressions = compare(results, baseline['views'], tolerance=options['tolerance'])
+        if regressions:
+            raise CommandError('Benchmark regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def run(self, options):
+        self.stdout.write(f"Seeding {options['cases']} cases...")
+        case_ids = generate(
+            options['cases'],
+            notes_per_case=options['notes_per_case'],
+            subscribers=options['subscribers'],
+            seed=0,
+            prefix='BENCH',
+        )
+        user = User.objects.create_user('bench-user', email=subscriber_email(1), password='bench', is_staff=True)
+        id_number = Case.objects.filter(id_number__isnull=False).values_list('id_number', flat=True).first()
+        CitizenProfile.objects.create(user=user, id_number=id_number or citizen_id_number(0))
+        case = Case.objects.get(pk=case_ids[len(case_ids) // 2])
+        # As the web server's startup warm-up would
+        ob_numbers.rebuild()
+
+        client = Client()
+        client.force_login(user)
+        results = {}
+        for name, method, path, data in view_requests(client, case):
+            results[name] = measure(client, method, path, data, iterations=options['iterations'])
+        return results
+
+    def report(self, results):
+        self.stdout.write(f"{'view':<26}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'peak KB':>10}")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<26}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['queries']:>9}{row['peak_kb']:>10.1f}"
+            )
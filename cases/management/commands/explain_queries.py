@@ -0,0 +1,96 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from cases import buffers
+from cases.benchmark import view_requests
+from cases.lookup import ob_numbers
+from cases.models import Case, CitizenProfile
+from cases.synthetic import citizen_id_number, generate, subscriber_email
+
+# Tables small enough by design that scanning them is expected
+SCAN_ALLOWED = {'cases_casestatuscounter'}
+
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?!.*\bUSING\b)')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a synthetic dataset inside a rolled-back transaction, drives every '
+        'view through the test client and runs EXPLAIN on each query it issues. '
+        'Fails if any query does a full table scan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=20000, help='Synthetic cases to seed')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"EXPLAIN checks are not implemented for {connection.vendor}")
+        try:
+            setup_test_environment()
+            owns_environment = True
+        except RuntimeError:
+            # Already set up, e.g. when called from the test suite
+            owns_environment = False
+        try:
+            with transaction.atomic():
+                failures = self.run_checks(options)
+                transaction.set_rollback(True)
+        finally:
+            if owns_environment:
+                teardown_test_environment()
+            # Nothing queued or cached for the seeded rows may outlive them
+            buffers.clear()
+            ob_numbers.reset()
+        if failures:
+            raise CommandError(f"{len(failures)} quer{'y' if len(failures) == 1 else 'ies'} did a full scan:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS('No full table scans found'))
+
+    def seed(self, total):
+        case_ids = generate(total, notes_per_case=2, subscribers=total, seed=0, prefix='EXPLAIN')
+        user = User.objects.create_user('explain-user', email=subscriber_email(1), password='explain', is_staff=True)
+        id_number = Case.objects.filter(id_number__isnull=False).values_list('id_number', flat=True).first()
+        CitizenProfile.objects.create(user=user, id_number=id_number or citizen_id_number(0))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return user, Case.objects.get(pk=case_ids[len(case_ids) // 2])
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                return [row[-1] for row in cursor.fetchall()]
+            cursor.execute('EXPLAIN ' + sql)
+            return [row[0] for row in cursor.fetchall()]
+
+    def run_checks(self, options):
+        user, case = self.seed(options['cases'])
+        client = Client()
+        client.force_login(user)
+        pattern = SQLITE_SCAN if connection.vendor == 'sqlite' else POSTGRES_SCAN
+        failures = []
+        for name, method, path, data in view_requests(client, case):
+            with CaptureQueriesContext(connection) as captured:
+                getattr(client, method)(path, data)
+            for query in captured.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                plan = self.explain(sql)
+                if options['verbose_plans']:
+                    self.stdout.write(f"[{name}] {sql}\n    " + "\n    ".join(plan))
+                scanned = {
+                    match.group(1) for line in plan for match in [pattern.search(line)]
+                    if match and match.group(1) not in SCAN_ALLOWED
+                }
+                if scanned:
+                    failures.append(f"[{name}] full scan of {', '.join(sorted(scanned))}: {sql}")
+            self.stdout.write(f"{name}: {len(captured.captured_queries)} queries checked")
+        return failures
@@ -0,0 +1,55 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cases.importer import CaseImporter, Checkpoint, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Imports cases from a CSV or JSON Lines file, updating cases whose OB number already exists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or .jsonl file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format; guessed from the file name by default')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per bulk write / transaction')
+        parser.add_argument('--skip-existing', action='store_true', help='Report existing OB numbers as errors instead of updating them')
+        parser.add_argument('--resume', action='store_true', help='Continue an interrupted import from its checkpoint')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: <path>.checkpoint.json)')
+        parser.add_argument('--errors', help='Write rejected rows to this CSV file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint = Checkpoint(options['checkpoint'] or f'{path}.checkpoint.json', path)
+        try:
+            resume = checkpoint.load() if options['resume'] else None
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        if resume:
+            self.stdout.write(f"Resuming after line {resume['last_line']}")
+
+        importer = CaseImporter(
+            batch_size=options['batch_size'],
+            update_existing=not options['skip_existing'],
+            checkpoint=checkpoint,
+            stdout=self.stdout,
+        )
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as handle:
+                result = importer.run(read_rows(handle, options['format'] or detect_format(path)), resume=resume)
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in result.errors[:20]:
+            self.stderr.write(str(error))
+        if len(result.errors) > 20:
+            self.stderr.write(f'... and {len(result.errors) - 20} more')
+        if options['errors'] and result.errors:
+            with open(options['errors'], 'w', newline='') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(['line', 'ob_number', 'error'])
+                writer.writerows([error.line, error.ob_number or '', error.message] for error in result.errors)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created + result.updated} case(s): '
+            f'{result.created} created, {result.updated} updated, {result.error_count} rejected'
+        ))
@@ -0,0 +1,60 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from cases import buffers
+from cases.loadtest import lookup_requests, run_asgi, run_wsgi
+from cases.lookup import ob_numbers
+from cases.models import Case
+from cases.synthetic import generate, subscriber_email
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway test database and compares the requests per second one process '
+        'sustains on the public lookup path (home lookup, case detail, subscribe) under '
+        'WSGI with a thread pool and under ASGI on a single event loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=2000, help='Synthetic cases to seed')
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Concurrent clients (WSGI threads / ASGI coroutines)')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run each server model')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"Seeding {options['cases']} cases...")
+            case_ids = generate(options['cases'], notes_per_case=3, subscribers=options['cases'], seed=0, prefix='LOAD')
+            cases = list(Case.objects.filter(pk__in=case_ids[:200]).only('pk', 'ob_number'))
+            requests = lookup_requests(cases, [subscriber_email(index) for index in range(50)])
+            # As the web server's startup warm-up would
+            ob_numbers.rebuild()
+            results = {}
+            # Failed requests are counted; their tracebacks would drown the report
+            logging.getLogger('django.request').disabled = True
+            for name, run in (('WSGI (threads)', run_wsgi), ('ASGI (event loop)', run_asgi)):
+                self.stdout.write(f"Running {name} for {options['duration']:g}s...")
+                # All clients share one address, which rate limiting would throttle
+                with override_settings(RATELIMIT_ENABLED=False):
+                    results[name] = run(requests, concurrency=options['concurrency'], duration=options['duration'])
+        finally:
+            logging.getLogger('django.request').disabled = False
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            # Nothing queued or cached for the seeded rows may outlive them
+            buffers.clear()
+            ob_numbers.reset()
+        self.report(results)
+
+    def report(self, results):
+        self.stdout.write(f"{'server':<20}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<20}{row['requests']:>10}{row['rps']:>10.1f}{row['p50_ms']:>10.2f}"
+                f"{row['p95_ms']:>10.2f}{row['errors']:>8}"
+            )
@@ -1,12 +1,25 @@
 from django.core.management.base import BaseCommand
 from cases.models import Case, OfficerNote
+from cases.synthetic import generate
 from django.utils import timezone
 from datetime import timedelta
+import time
 
 class Command(BaseCommand):
-    help = 'Populates the database with sample data'
+    help = 'Populates the database with sample data, or a large synthetic dataset with --cases'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=0, help='Generate this many synthetic cases instead of the three samples')
+        parser.add_argument('--notes-per-case', type=int, default=5, help='Average officer notes per synthetic case')
+        parser.add_argument('--subscribers', type=int, default=0, help='Notification subscriptions to spread over the synthetic cases')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for a reproducible dataset')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk_create / transaction')
+        parser.add_argument('--prefix', default='OB', help='OB number prefix; change it to generate more data into a populated database')
 
     def handle(self, *args, **kwargs):
+        if kwargs['cases']:
+            return self.generate(**kwargs)
+
         # Create Cases
         case1 = Case.objects.create(
             ob_number='OB/2025/001',
@@ -53,3 +66,17 @@ class Command(BaseCommand):
         )
 
         self.stdout.write(self.style.SUCCESS('Successfully populated database with sample data'))
+
+    def generate(self, **options):
+        started = time.monotonic()
+        case_ids = generate(
+            options['cases'],
+            notes_per_case=options['notes_per_case'],
+            subscribers=options['subscribers'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            prefix=options['prefix'],
+            stdout=self.stdout,
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Generated {len(case_ids)} cases in {elapsed:.1f}s'))
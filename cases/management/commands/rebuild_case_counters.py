@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cases.stats import rebuild_status_counters
+
+
+class Command(BaseCommand):
+    help = 'Recounts cases per status into the CaseStatusCounter table'
+
+    def handle(self, *args, **kwargs):
+        counts = rebuild_status_counters()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt case counters: {counts}"))
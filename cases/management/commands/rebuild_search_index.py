@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from cases.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of cases and officer notes'
+
+    def handle(self, *args, **kwargs):
+        if not fts_available():
+            self.stdout.write('This database backend keeps its search index up to date itself; nothing to do')
+            return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} document(s)"))
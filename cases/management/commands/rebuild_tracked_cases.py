@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cases.tracking import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the TrackedCase relation for every user'
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt tracked cases for {count} user(s)"))
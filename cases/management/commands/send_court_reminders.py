@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from cases.court_calendar import queue_court_reminders
+
+
+class Command(BaseCommand):
+    help = 'Queues a reminder to subscribers of every case with a hearing in the next N hours'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='How far ahead to look for hearings')
+
+    def handle(self, *args, **options):
+        queued = queue_court_reminders(hours=options['hours'])
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} hearing reminder(s); send_notifications delivers them'))
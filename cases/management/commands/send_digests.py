@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from cases.digests import PERIODS, build_digest
+from cases.notifications import process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Queues hourly/daily/weekly notification digests that are due and sends them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frequency', choices=list(PERIODS), action='append', help='Only these frequencies (default: all)')
+        parser.add_argument('--force', action='store_true', help='Build the digest even if its period has not elapsed')
+        parser.add_argument('--no-send', action='store_true', help='Only queue the deliveries; leave sending to send_notifications')
+
+    def handle(self, *args, **options):
+        for frequency in options['frequency'] or PERIODS:
+            queued = build_digest(frequency, force=options['force'])
+            if queued is None:
+                self.stdout.write(f'{frequency}: not due yet')
+            else:
+                self.stdout.write(f'{frequency}: queued {queued} digest(s)')
+        if not options['no_send']:
+            sent, failed = process_outbox()
+            self.stdout.write(self.style.SUCCESS(f'Sent {sent} notification(s), {failed} permanently failed'))
@@ -0,0 +1,51 @@
+import logging
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from cases.notifications import process_outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Fans out queued case notifications and delivers them over one SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Deliveries sent per batch (default: NOTIFICATION_BATCH_SIZE)')
+        parser.add_argument('--max-attempts', type=int, default=None, help='Attempts before a delivery is marked failed (default: NOTIFICATION_MAX_ATTEMPTS)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting once it is drained')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls when --loop is set')
+
+    def handle(self, *args, **options):
+        connection = get_connection(fail_silently=False)
+        try:
+            while True:
+                try:
+                    sent, failed = process_outbox(
+                        connection=connection,
+                        batch_size=options['batch_size'],
+                        max_attempts=options['max_attempts'],
+                    )
+                except Exception:
+                    if not options['loop']:
+                        raise
+                    # An SMTP or database outage must not kill the worker
+                    logger.exception("Processing the notification outbox failed; retrying in %ss", options['interval'])
+                    connection.close()
+                    time.sleep(options['interval'])
+                    continue
+                if sent or failed:
+                    self.stdout.write(f'Sent {sent} notification(s), {failed} permanently failed')
+                if not options['loop']:
+                    break
+                if not sent:
+                    # Don't hold an idle SMTP session open between polls
+                    connection.close()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+        self.stdout.write(self.style.SUCCESS('Notification outbox processed'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from cases.models import Case
+from cases.transitions import UNCHANGED, bulk_transition
+
+
+class Command(BaseCommand):
+    help = 'Moves many cases to a new status and/or court date at once, notifying subscribers with one digest each'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ob_numbers', nargs='+', help='OB numbers of the cases to move')
+        parser.add_argument('--status', choices=[status for status, _ in Case.STATUS_CHOICES])
+        parser.add_argument('--court-date', help='New court date, e.g. "2025-11-03 09:00"')
+        parser.add_argument('--clear-court-date', action='store_true', help='Remove the court date')
+        parser.add_argument('--no-notify', action='store_true', help='Do not notify subscribers')
+
+    def handle(self, *args, **options):
+        court_date = UNCHANGED
+        if options['clear_court_date']:
+            court_date = None
+        elif options['court_date']:
+            court_date = parse_datetime(options['court_date'])
+            if court_date is None:
+                raise CommandError(f"Invalid court date: {options['court_date']}")
+            if timezone.is_naive(court_date):
+                court_date = timezone.make_aware(court_date)
+        if options['status'] is None and court_date is UNCHANGED:
+            raise CommandError('Nothing to change: pass --status, --court-date or --clear-court-date')
+
+        cases = Case.objects.filter(ob_number__in=options['ob_numbers'])
+        missing = set(options['ob_numbers']) - set(cases.values_list('ob_number', flat=True))
+        for ob_number in sorted(missing):
+            self.stderr.write(f'No case with OB number {ob_number}')
+        events = bulk_transition(cases, status=options['status'], court_date=court_date, notify=not options['no_notify'])
+        self.stdout.write(self.style.SUCCESS(f'Updated {len(events)} case(s)'))
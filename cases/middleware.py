@@ -0,0 +1,158 @@
+"""
+Opt-in per-request SQL instrumentation.
+
+Enable with QUERY_INSTRUMENTATION = True. Every request then records its
+query count, time spent in the database, template render time (for views
+returning a TemplateResponse) and its slowest statements. The numbers are
+sent back in a Server-Timing header, kept in a rolling in-process window
+per view (served to officers by the query_stats view), and a warning is
+logged when a view goes over its query budget.
+"""
+import heapq
+import logging
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class RequestProfile:
+    """Execute wrapper collecting the queries of one request."""
+
+    def __init__(self, keep_slowest=3):
+        self.count = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.keep_slowest = keep_slowest
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.db_time += elapsed
+            entry = (elapsed, self.count, sql)
+            if len(self.slowest) < self.keep_slowest:
+                heapq.heappush(self.slowest, entry)
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def slowest_statements(self):
+        return [(sql, elapsed) for elapsed, _, sql in sorted(self.slowest, reverse=True)]
+
+
+class ViewStats:
+    """Rolling window of request profiles per view, shared by the process."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._slowest = defaultdict(list)
+
+    def record(self, view, profile, total_time):
+        sample = (profile.count, profile.db_time, profile.render_time, total_time)
+        with self._lock:
+            self._samples[view].append(sample)
+            slowest = self._slowest[view]
+            for sql, elapsed in profile.slowest_statements():
+                slowest.append((elapsed, sql))
+            slowest.sort(reverse=True)
+            del slowest[profile.keep_slowest * 2:]
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._slowest.clear()
+
+    def snapshot(self):
+        with self._lock:
+            samples = {view: list(rows) for view, rows in self._samples.items()}
+            slowest = {view: list(rows) for view, rows in self._slowest.items()}
+
+        def ms(value):
+            return round(value * 1000, 2)
+
+        report = {}
+        for view, rows in samples.items():
+            queries, db, render, total = zip(*rows)
+            report[view] = {
+                'requests': len(rows),
+                'queries_avg': round(statistics.fmean(queries), 2),
+                'queries_max': max(queries),
+                'db_ms_avg': ms(statistics.fmean(db)),
+                'render_ms_avg': ms(statistics.fmean(render)),
+                'total_ms_avg': ms(statistics.fmean(total)),
+                'total_ms_max': ms(max(total)),
+                'slowest_statements': [{'ms': ms(elapsed), 'sql': sql[:500]} for elapsed, sql in slowest.get(view, [])],
+            }
+        return report
+
+
+stats = ViewStats(window=getattr(settings, 'QUERY_INSTRUMENTATION_WINDOW', 200))
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budget = getattr(settings, 'QUERY_BUDGET', 20)
+        self.view_budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        self.keep_slowest = getattr(settings, 'QUERY_INSTRUMENTATION_SLOWEST', 3)
+
+    def __call__(self, request):
+        profile = RequestProfile(keep_slowest=self.keep_slowest)
+        request.query_profile = profile
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        view = self.view_name(request)
+        stats.record(view, profile, total)
+        response['Server-Timing'] = (
+            f'db;dur={profile.db_time * 1000:.2f};desc="{profile.count} queries", '
+            f'tpl;dur={profile.render_time * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        budget = self.view_budgets.get(view, self.budget)
+        if budget is not None and profile.count > budget:
+            logger.warning(
+                "%s ran %d queries (budget %d) in %.1fms; slowest: %s",
+                view, profile.count, budget, profile.db_time * 1000,
+                '; '.join(sql[:200] for sql, _ in profile.slowest_statements()),
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # TemplateResponses render right after this hook returns. Function
+        # views that call render() themselves count rendering as view time.
+        profile = getattr(request, 'query_profile', None)
+        if profile is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                profile.render_time += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unresolved'
+        return match.view_name or match._func_path
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0003_notification_outbox"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="case",
+            index=models.Index(fields=["-created_at", "-id"], name="case_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="case",
+            index=models.Index(
+                fields=["status", "-created_at", "-id"], name="case_status_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:20
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def seed_counters(apps, schema_editor):
+    Case = apps.get_model("cases", "Case")
+    CaseStatusCounter = apps.get_model("cases", "CaseStatusCounter")
+    grouped = dict(
+        Case.objects.order_by().values_list("status").annotate(n=Count("pk"))
+    )
+    CaseStatusCounter.objects.bulk_create(
+        [
+            CaseStatusCounter(status=status, count=grouped.get(status, 0))
+            for status in ("investigation", "dci", "court", "judgement")
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0004_case_list_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CaseStatusCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("investigation", "Investigation"),
+                            ("dci", "DCI"),
+                            ("court", "Court"),
+                            ("judgement", "Judgement"),
+                        ],
+                        max_length=20,
+                        unique=True,
+                    ),
+                ),
+                ("count", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
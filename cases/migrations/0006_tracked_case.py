@@ -0,0 +1,91 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_tracked_cases(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Case = apps.get_model("cases", "Case")
+    CitizenProfile = apps.get_model("cases", "CitizenProfile")
+    NotificationSubscription = apps.get_model("cases", "NotificationSubscription")
+    TrackedCase = apps.get_model("cases", "TrackedCase")
+    profiles = dict(CitizenProfile.objects.values_list("user_id", "id_number"))
+    for user in User.objects.iterator():
+        subscribed = set()
+        if user.email:
+            subscribed = set(
+                NotificationSubscription.objects.filter(email=user.email).values_list(
+                    "case_id", flat=True
+                )
+            )
+        linked = set()
+        if profiles.get(user.pk):
+            linked = set(
+                Case.objects.filter(id_number=profiles[user.pk]).values_list(
+                    "pk", flat=True
+                )
+            )
+        TrackedCase.objects.bulk_create(
+            [
+                TrackedCase(
+                    user_id=user.pk,
+                    case_id=case_id,
+                    via_subscription=case_id in subscribed,
+                    via_id_number=case_id in linked,
+                )
+                for case_id in subscribed | linked
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0005_case_status_counter"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrackedCase",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("via_subscription", models.BooleanField(default=False)),
+                ("via_id_number", models.BooleanField(default=False)),
+                (
+                    "case",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trackers",
+                        to="cases.case",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tracked_cases",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "case"), name="unique_tracked_case"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_tracked_cases, migrations.RunPython.noop),
+    ]
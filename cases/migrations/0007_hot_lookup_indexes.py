@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:22
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    NotificationSubscription = apps.get_model("cases", "NotificationSubscription")
+    duplicates = (
+        NotificationSubscription.objects.values("case_id", "email")
+        .annotate(keep=Min("pk"), n=Count("pk"))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        NotificationSubscription.objects.filter(
+            case_id=row["case_id"], email=row["email"]
+        ).exclude(pk=row["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("cases", "0006_tracked_case"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_subscriptions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="case",
+            name="court_date",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="case",
+            name="id_number",
+            field=models.CharField(blank=True, db_index=True, max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name="notificationsubscription",
+            name="email",
+            field=models.EmailField(db_index=True, max_length=254),
+        ),
+        migrations.AddIndex(
+            model_name="officernote",
+            index=models.Index(
+                fields=["case", "-created_at"], name="note_case_created_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="notificationsubscription",
+            constraint=models.UniqueConstraint(
+                fields=("case", "email"), name="unique_subscription_per_case"
+            ),
+        ),
+        # Subscription signals resolve users by email (cases.tracking), but
+        # auth.User has no index on it. This index lives on auth_user, a table
+        # owned by django.contrib.auth, so it is not part of any model state:
+        # it is created here with raw SQL and guarded in case it already exists.
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS cases_auth_user_email_idx ON auth_user (email)",
+            "DROP INDEX IF EXISTS cases_auth_user_email_idx",
+        ),
+    ]
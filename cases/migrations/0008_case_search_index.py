@@ -0,0 +1,60 @@
+# Full-text search index for cases and officer notes (see cases/search.py)
+
+from django.db import migrations
+
+FTS_TABLE = "cases_search"
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "case_id UNINDEXED, ob_number, title, body, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, case_id, ob_number, title, body) "
+            "SELECT id * 2, id, ob_number, title, description FROM cases_case"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, case_id, ob_number, title, body) "
+            "SELECT id * 2 + 1, case_id, '', '', note FROM cases_officernote"
+        )
+    elif vendor == "postgresql":
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+
+        Case = apps.get_model("cases", "Case")
+        OfficerNote = apps.get_model("cases", "OfficerNote")
+        schema_editor.add_index(
+            Case,
+            GinIndex(
+                SearchVector("ob_number", "title", "description", config="simple"),
+                name="case_search_gin",
+            ),
+        )
+        schema_editor.add_index(
+            OfficerNote,
+            GinIndex(SearchVector("note", config="simple"), name="note_search_gin"),
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS case_search_gin")
+        schema_editor.execute("DROP INDEX IF EXISTS note_search_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0007_hot_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
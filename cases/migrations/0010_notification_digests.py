@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0009_case_status_event"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DigestCursor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "frequency",
+                    models.CharField(
+                        choices=[
+                            ("immediate", "Immediately"),
+                            ("hourly", "Hourly digest"),
+                            ("daily", "Daily digest"),
+                            ("weekly", "Weekly digest"),
+                        ],
+                        max_length=10,
+                        unique=True,
+                    ),
+                ),
+                ("last_outbox_id", models.BigIntegerField(default=0)),
+                ("last_run_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="notificationoutbox",
+            name="digest_frequency",
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name="notificationsubscription",
+            name="frequency",
+            field=models.CharField(
+                choices=[
+                    ("immediate", "Immediately"),
+                    ("hourly", "Hourly digest"),
+                    ("daily", "Daily digest"),
+                    ("weekly", "Weekly digest"),
+                ],
+                default="immediate",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0010_notification_digests"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourtReminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("court_date", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="case",
+            name="court",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name="case",
+            index=models.Index(
+                fields=["court", "court_date"], name="case_court_date_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="courtreminder",
+            name="case",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="court_reminders",
+                to="cases.case",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="courtreminder",
+            constraint=models.UniqueConstraint(
+                fields=("case", "court_date"), name="unique_court_reminder"
+            ),
+        ),
+    ]
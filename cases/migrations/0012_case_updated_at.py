@@ -0,0 +1,34 @@
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F, Max
+from django.db.models.functions import Coalesce, Greatest
+
+
+def backfill_updated_at(apps, schema_editor):
+    Case = apps.get_model("cases", "Case")
+    OfficerNote = apps.get_model("cases", "OfficerNote")
+    Case.objects.update(updated_at=F("created_at"))
+    latest_notes = OfficerNote.objects.values("case_id").annotate(latest=Max("created_at"))
+    for row in latest_notes.iterator():
+        Case.objects.filter(pk=row["case_id"]).update(
+            updated_at=Greatest(Coalesce(F("updated_at"), F("created_at")), row["latest"])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0011_court_calendar"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="case",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def fold_duplicate_reports(apps, schema_editor):
+    # Same normalisation as cases.models.report_hash
+    AnonymousReport = apps.get_model("cases", "AnonymousReport")
+    kept = {}
+    duplicates = []
+    for report in AnonymousReport.objects.order_by("created_at", "pk").iterator():
+        digest = hashlib.sha256(" ".join(report.details.split()).encode()).hexdigest()
+        first = kept.get(digest)
+        if first is None:
+            kept[digest] = report
+            report.content_hash = digest
+            report.duplicate_count = 1
+            report.last_reported_at = report.created_at
+        else:
+            first.duplicate_count += 1
+            first.last_reported_at = report.created_at
+            duplicates.append(report.pk)
+    for start in range(0, len(duplicates), 500):
+        AnonymousReport.objects.filter(pk__in=duplicates[start:start + 500]).delete()
+    AnonymousReport.objects.bulk_update(
+        kept.values(), ["content_hash", "duplicate_count", "last_reported_at"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0012_case_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="anonymousreport",
+            name="content_hash",
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="anonymousreport",
+            name="duplicate_count",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="anonymousreport",
+            name="last_reported_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fold_duplicate_reports, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="anonymousreport",
+            name="content_hash",
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name="anonymousreport",
+            index=models.Index(fields=["created_at", "id"], name="report_created_idx"),
+        ),
+    ]
@@ -1,6 +1,50 @@
+import hashlib
+
 from django.db import models
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 
+
+# Eager-loading helpers, so templates that walk notes and cases run a fixed
+# number of queries however many rows they render.
+class CaseQuerySet(models.QuerySet):
+    def with_notes(self):
+        # case.notes.all() served from one prefetch query, oldest first
+        return self.prefetch_related(Prefetch('notes', queryset=OfficerNote.objects.order_by('created_at', 'pk')))
+
+    def with_events(self):
+        # case.events.all() as the status history, oldest first
+        return self.prefetch_related(
+            Prefetch('events', queryset=CaseStatusEvent.objects.only(
+                'case', 'old_status', 'new_status', 'old_court_date', 'new_court_date', 'created_at',
+            ).order_by('created_at', 'pk'))
+        )
+
+    def with_note_count(self):
+        # A correlated subquery rather than JOIN + GROUP BY, so paginated and
+        # filtered lists keep their index plans and only count rendered rows
+        counts = (
+            OfficerNote.objects.filter(case=OuterRef('pk'))
+            .order_by()
+            .values('case')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return self.annotate(note_count=Coalesce(Subquery(counts), 0))
+
+
+class OfficerNoteQuerySet(models.QuerySet):
+    def feed(self):
+        # Newest first with the case joined in, for activity lists
+        return self.select_related('case').order_by('-created_at', '-pk')
+
+
+class NotificationSubscriptionQuerySet(models.QuerySet):
+    def with_case(self):
+        return self.select_related('case')
+
+
 class Case(models.Model):
     STATUS_CHOICES = [
         ('investigation', 'Investigation'),
@@ -13,14 +57,64 @@ class Case(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='investigation')
-    court_date = models.DateTimeField(null=True, blank=True)
+    court_date = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Court hearing the case, e.g. "Milimani Law Courts"; used by the court calendar
+    court = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Last change to the case or its notes; drives conditional GET responses
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     # Optional citizen identifier used to associate cases with a registering user
-    id_number = models.CharField(max_length=50, blank=True, null=True)
+    id_number = models.CharField(max_length=50, blank=True, null=True, db_index=True)
+
+    objects = CaseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the officer case list, optionally by status
+            models.Index(fields=['-created_at', '-id'], name='case_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='case_status_created_idx'),
+            # Court calendar: one court's hearings in a date range
+            models.Index(fields=['court', 'court_date'], name='case_court_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.ob_number} - {self.title}"
 
+    # Stored values remembered on load (and refreshed after each save) so
+    # edits can save just the changed columns and signal receivers can tell
+    # what a save changed without re-reading the row.
+    LOADED_FIELDS = ('ob_number', 'title', 'description', 'status', 'court_date', 'court', 'id_number')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: instance.__dict__[name] for name in cls.LOADED_FIELDS if name in instance.__dict__
+        }
+        return instance
+
+    def loaded_value(self, field, default=None):
+        return getattr(self, '_loaded_values', {}).get(field, default)
+
+    def changed_fields(self):
+        # Deferred fields that were never assigned are unchanged; assigned
+        # fields without a loaded value (e.g. a new case) count as changed
+        loaded = getattr(self, '_loaded_values', {})
+        return [
+            name for name in self.LOADED_FIELDS
+            if name in self.__dict__ and (name not in loaded or loaded[name] != self.__dict__[name])
+        ]
+
+
+# Running per-status totals, maintained by signals on Case save/delete so the
+# officer headline numbers are a four-row read instead of a table scan.
+class CaseStatusCounter(models.Model):
+    status = models.CharField(max_length=20, choices=Case.STATUS_CHOICES, unique=True)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.status}: {self.count}"
+
 
 class CitizenProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='citizen_profile')
@@ -29,24 +123,181 @@ class CitizenProfile(models.Model):
     def __str__(self):
         return f"{self.user.username} ({self.id_number})"
 
+# Materialised "cases this user tracks" (subscribed by email or linked by ID
+# number), kept current by signals so the dashboard is one indexed join.
+# Resolving subscribers to users relies on cases_auth_user_email_idx, an index
+# on auth_user.email that migration 0007 creates with raw SQL because
+# auth.User is not a model this app can declare indexes on.
+class TrackedCase(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tracked_cases')
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='trackers')
+    via_subscription = models.BooleanField(default=False)
+    via_id_number = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'case'], name='unique_tracked_case'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} tracks {self.case_id}"
+
 class OfficerNote(models.Model):
     case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='notes')
     note = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = OfficerNoteQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Newest-first notes per case (case detail, dashboard feed)
+            models.Index(fields=['case', '-created_at'], name='note_case_created_idx'),
+        ]
+
     def __str__(self):
         return f"Note for {self.case.ob_number} at {self.created_at}"
 
 class NotificationSubscription(models.Model):
+    FREQUENCY_CHOICES = [
+        ('immediate', 'Immediately'),
+        ('hourly', 'Hourly digest'),
+        ('daily', 'Daily digest'),
+        ('weekly', 'Weekly digest'),
+    ]
+
     case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='subscriptions')
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
+    # Immediate subscribers get a message per update; the others are sent one
+    # digest per period by the send_digests command
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='immediate')
+
+    objects = NotificationSubscriptionQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['case', 'email'], name='unique_subscription_per_case'),
+        ]
 
     def __str__(self):
         return f"{self.email} subscribed to {self.case.ob_number}"
 
+def report_hash(details):
+    # Reports differing only in whitespace count as the same report
+    return hashlib.sha256(' '.join(details.split()).encode()).hexdigest()
+
+
 class AnonymousReport(models.Model):
     details = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Identical submissions share one row: content_hash identifies the
+    # whitespace-normalised text and duplicate_count counts how many times
+    # it was sent
+    content_hash = models.CharField(max_length=64, unique=True)
+    duplicate_count = models.PositiveIntegerField(default=1)
+    last_reported_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Newest-first keyset pagination of the triage list
+            models.Index(fields=['created_at', 'id'], name='report_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.content_hash:
+            self.content_hash = report_hash(self.details)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Report at {self.created_at}"
+
+# A queued case update. Requests only insert one row per update; the
+# send_notifications worker later fans it out into per-subscriber deliveries.
+class NotificationOutbox(models.Model):
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='outbox', null=True, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set once deliveries have been created for every subscriber
+    fanned_out_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Set on the rows send_digests creates to hold a digest run's deliveries;
+    # those rows are not case updates themselves
+    digest_frequency = models.CharField(max_length=10, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} ({self.created_at})"
+
+class NotificationDelivery(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    outbox = models.ForeignKey(NotificationOutbox, on_delete=models.CASCADE, related_name='deliveries')
+    email = models.EmailField()
+    # Per-recipient message for digests; empty means the outbox subject/body
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='delivery_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['outbox', 'email'], name='unique_delivery_per_email'),
+        ]
+
+    def __str__(self):
+        return f"{self.email} <- {self.outbox.subject} ({self.status})"
+
+# One status and/or court date change of a case. Bulk transitions link all
+# of their events to a single outbox row, which the worker turns into one
+# digest per subscriber covering every affected case they follow.
+class CaseStatusEvent(models.Model):
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='events')
+    old_status = models.CharField(max_length=20, choices=Case.STATUS_CHOICES)
+    new_status = models.CharField(max_length=20, choices=Case.STATUS_CHOICES)
+    old_court_date = models.DateTimeField(null=True, blank=True)
+    new_court_date = models.DateTimeField(null=True, blank=True)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    outbox = models.ForeignKey(NotificationOutbox, on_delete=models.SET_NULL, null=True, blank=True, related_name='events')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['case', '-created_at'], name='event_case_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.case_id}: {self.old_status} -> {self.new_status} ({self.created_at})"
+
+# How far each digest frequency has got through the outbox, which doubles as
+# the log of case updates: the next digest covers rows after last_outbox_id.
+class DigestCursor(models.Model):
+    frequency = models.CharField(max_length=10, choices=NotificationSubscription.FREQUENCY_CHOICES, unique=True)
+    last_outbox_id = models.BigIntegerField(default=0)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.frequency} digest through outbox #{self.last_outbox_id}"
+
+# A hearing reminder that has been queued, so each court date of a case is
+# announced once however often send_court_reminders runs.
+class CourtReminder(models.Model):
+    case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='court_reminders')
+    court_date = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['case', 'court_date'], name='unique_court_reminder'),
+        ]
+
+    def __str__(self):
+        return f"Reminder for {self.case_id} at {self.court_date}"
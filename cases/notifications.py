@@ -0,0 +1,221 @@
+"""
+Case notification outbox.
+
+Views only queue a NotificationOutbox row per case update, so saving a case
+costs the same however many subscribers it has. The send_notifications
+management command fans queued rows out into one NotificationDelivery per
+subscriber and sends them in batches over a single reused SMTP connection,
+retrying failures with exponential backoff. Deliveries are claimed one at a
+time, so more than one worker may run.
+
+Outbox rows without a case are digests of a bulk transition: they are fanned
+out into one delivery per subscriber whose message lists all of the
+subscriber's affected cases. Only immediate subscribers are fanned out here;
+the others are covered by periodic digests (see cases.digests).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CaseStatusEvent, NotificationOutbox, NotificationDelivery, NotificationSubscription
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def queue_case_notification(case, subject, body):
+    """
+    Queue a notification for all subscribers of a case. Only the outbox row is
+    written here; subscriber fan-out and delivery happen in the worker.
+    """
+    return NotificationOutbox.objects.create(case=case, subject=subject, body=body)
+
+
+def fan_out_pending(limit=None, chunk_size=None):
+    """
+    Create one pending delivery per distinct immediate subscriber for every
+    outbox row that has not been fanned out yet. Returns the number of outbox rows handled.
+    """
+    limit = limit or _setting('NOTIFICATION_BATCH_SIZE', 100)
+    chunk_size = chunk_size or _setting('NOTIFICATION_FANOUT_CHUNK_SIZE', 1000)
+    pending = list(NotificationOutbox.objects.filter(fanned_out_at__isnull=True).order_by('pk')[:limit])
+    for outbox in pending:
+        now = timezone.now()
+        with transaction.atomic():
+            if outbox.case_id is None:
+                deliveries = _digest_deliveries(outbox, now, chunk_size)
+            else:
+                emails = (
+                    NotificationSubscription.objects.filter(case_id=outbox.case_id, frequency='immediate')
+                    .values_list('email', flat=True)
+                    .distinct()
+                    .iterator(chunk_size=chunk_size)
+                )
+                deliveries = (NotificationDelivery(outbox=outbox, email=email, next_attempt_at=now) for email in emails)
+            batch = []
+            for delivery in deliveries:
+                batch.append(delivery)
+                if len(batch) >= chunk_size:
+                    NotificationDelivery.objects.bulk_create(batch, ignore_conflicts=True)
+                    batch = []
+            if batch:
+                NotificationDelivery.objects.bulk_create(batch, ignore_conflicts=True)
+            NotificationOutbox.objects.filter(pk=outbox.pk).update(fanned_out_at=now)
+    return len(pending)
+
+
+def describe_event(event):
+    """One line describing what ``event`` changed, for notification bodies."""
+    changes = []
+    if event.old_status != event.new_status:
+        changes.append(f"status {event.get_old_status_display()} -> {event.get_new_status_display()}")
+    if event.old_court_date != event.new_court_date:
+        date = event.new_court_date.strftime('%Y-%m-%d %H:%M') if event.new_court_date else 'removed'
+        changes.append(f"court date {date}")
+    return ', '.join(changes) or 'updated'
+
+
+def _digest_deliveries(outbox, now, chunk_size):
+    """One delivery per subscriber of any case in a bulk transition, listing their cases."""
+    events = {
+        event.case_id: event
+        for event in CaseStatusEvent.objects.filter(outbox=outbox).select_related('case')
+    }
+    subscriptions = (
+        NotificationSubscription.objects.filter(case_id__in=events, frequency='immediate')
+        .order_by('email')
+        .values_list('email', 'case_id')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    def digest(email, case_ids):
+        cases = sorted((events[pk] for pk in case_ids), key=lambda event: event.case.ob_number)
+        if len(cases) == 1:
+            subject = f"HakiFlow: {cases[0].case.ob_number} updated"
+        else:
+            subject = f"HakiFlow: {len(cases)} of your cases were updated"
+        lines = [f"{event.case.ob_number} - {event.case.title}: {describe_event(event)}" for event in cases]
+        body = "\n".join(["The following cases you follow were updated:", ""] + lines)
+        return NotificationDelivery(outbox=outbox, email=email, subject=subject, body=body, next_attempt_at=now)
+
+    current, case_ids = None, []
+    for email, case_id in subscriptions:
+        if email != current and case_ids:
+            yield digest(current, case_ids)
+            case_ids = []
+        current = email
+        case_ids.append(case_id)
+    if case_ids:
+        yield digest(current, case_ids)
+
+
+def retry_delay(attempts):
+    """Exponential backoff for the given number of failed attempts, capped."""
+    base = _setting('NOTIFICATION_RETRY_BACKOFF', 60)
+    cap = _setting('NOTIFICATION_RETRY_BACKOFF_MAX', 3600)
+    return timedelta(seconds=min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+def claim_delivery(delivery, now):
+    """
+    Take ``delivery`` for this worker. The conditional UPDATE only matches if
+    no other worker claimed it first; a claim left by a worker that died
+    expires after NOTIFICATION_CLAIM_TIMEOUT seconds and the row is retried.
+    """
+    lease = now + timedelta(seconds=_setting('NOTIFICATION_CLAIM_TIMEOUT', 300))
+    claimed = NotificationDelivery.objects.filter(
+        pk=delivery.pk, status='pending', next_attempt_at=delivery.next_attempt_at,
+    ).update(next_attempt_at=lease, attempts=F('attempts') + 1)
+    delivery.attempts += 1
+    return bool(claimed)
+
+
+def deliver_due(connection, batch_size=None, max_attempts=None):
+    """
+    Send up to batch_size due deliveries, one message per recipient, over the
+    given (already open) mail connection. Returns (sent, retrying, failed)
+    counts; retrying deliveries are rescheduled with backoff.
+
+    Each delivery is claimed before it is sent and its outcome saved right
+    after, so several workers can run at once and a crash re-sends at most
+    the message in flight.
+    """
+    batch_size = batch_size or _setting('NOTIFICATION_BATCH_SIZE', 100)
+    max_attempts = max_attempts or _setting('NOTIFICATION_MAX_ATTEMPTS', 5)
+    from_email = _setting('DEFAULT_FROM_EMAIL', None)
+    now = timezone.now()
+    due = list(
+        NotificationDelivery.objects.filter(status='pending', next_attempt_at__lte=now)
+        .select_related('outbox')
+        .order_by('next_attempt_at', 'pk')[:batch_size]
+    )
+    sent = retrying = failed = 0
+    for delivery in due:
+        if not claim_delivery(delivery, now):
+            continue
+        message = EmailMessage(
+            subject=delivery.subject or delivery.outbox.subject,
+            body=delivery.body or delivery.outbox.body,
+            from_email=from_email,
+            to=[delivery.email],
+            connection=connection,
+        )
+        try:
+            connection.send_messages([message])
+        except Exception as exc:
+            delivery.last_error = str(exc)
+            if delivery.attempts >= max_attempts:
+                delivery.status = 'failed'
+                failed += 1
+            else:
+                delivery.next_attempt_at = now + retry_delay(delivery.attempts)
+                retrying += 1
+            logger.warning("Notification to %s failed (attempt %s): %s", delivery.email, delivery.attempts, exc)
+            delivery.save(update_fields=['status', 'next_attempt_at', 'last_error'])
+            # Drop a possibly broken SMTP session; the next send reconnects
+            try:
+                connection.close()
+                connection.open()
+            except Exception:
+                logger.exception("Could not reopen mail connection")
+        else:
+            delivery.status = 'sent'
+            delivery.sent_at = timezone.now()
+            delivery.last_error = ''
+            delivery.save(update_fields=['status', 'sent_at', 'last_error'])
+            sent += 1
+    return sent, retrying, failed
+
+
+def process_outbox(connection=None, batch_size=None, max_attempts=None):
+    """
+    Drain the outbox: fan out queued rows, then send due deliveries in batches
+    until none are left. Returns (sent, failed) totals.
+    """
+    own_connection = connection is None
+    if own_connection:
+        connection = get_connection(fail_silently=False)
+    total_sent = total_failed = 0
+    try:
+        while fan_out_pending(limit=batch_size):
+            pass
+        # Opened inside the try so an SMTP outage still closes an owned connection
+        connection.open()
+        while True:
+            sent, retrying, failed = deliver_due(connection, batch_size=batch_size, max_attempts=max_attempts)
+            total_sent += sent
+            total_failed += failed
+            if not (sent or retrying or failed):
+                break
+    finally:
+        if own_connection:
+            connection.close()
+    return total_sent, total_failed
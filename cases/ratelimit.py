@@ -0,0 +1,281 @@
+"""
+Per-IP rate limiting for the public endpoints.
+
+Each limited view has a rate such as '10/m' (settings.RATELIMITS overrides
+DEFAULT_RATES). Hits are counted per (endpoint, client IP) with a sliding
+window counter: the current fixed window's count plus the previous window's
+count weighted by how much of it still overlaps the sliding window. That
+needs two integers per key, unlike a log of timestamps, and smooths out the
+burst a plain fixed window allows at its boundary.
+
+Counters live in a pluggable store: MemoryStore (per process, the default,
+a dict lookup per request) or CacheStore (a Django cache shared by every
+worker). Async views count hits through the store's ahit(), so a network or
+database cache never blocks the event loop; stores without one are run in a
+thread. Over the limit, the view is not called and the client gets a 429
+with Retry-After.
+"""
+import functools
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATES = {
+    'home': '60/m',
+    'subscribe': '10/m',
+    'report': '5/m',
+    'signup': '5/h',
+}
+
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/m' or '100/5m' as (limit, period in seconds)."""
+    match = re.fullmatch(r'(\d+)/(\d*)([smhd])', rate.strip())
+    if match is None:
+        raise ValueError(f'Invalid rate: {rate!r}')
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * UNITS[unit]
+
+
+def retry_after(previous, current, limit, period, offset):
+    """Seconds until a client at this count is allowed another hit, if it stops now."""
+    if current >= limit:
+        # Wait for the next window, where today's hits become the previous
+        # window's and fade out as it slides past them
+        return period - offset + period * max(0.0, 1 - (limit - 1) / current)
+    return max(0.0, (1 - (limit - 1 - current) / previous) * period - offset)
+
+
+class MemoryStore:
+    """
+    Counters in a dict in this process, most recently hit last. Past
+    ``max_keys`` the least recently hit key is evicted, so a flood from many
+    addresses costs O(1) per request; an evicted address starts afresh.
+    Entries are updated without a lock: two threads racing on one key can
+    lose a hit, which a limit tolerates, and the allowed path stays a few
+    dict and list operations.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()
+
+    def hit(self, key, limit, period, now):
+        """Count a hit. Returns None if allowed, else the seconds to wait."""
+        position = now / period
+        window = int(position)
+        # [window, previous window's count, this window's count]
+        entry = self._windows.get(key)
+        if entry is None:
+            self._windows[key] = [window, 0, 1]
+            if len(self._windows) > self.max_keys:
+                self._evict()
+            return None
+        try:
+            self._windows.move_to_end(key)
+        except KeyError:
+            # Evicted by another thread meanwhile; this hit is still counted below
+            pass
+        if entry[0] != window:
+            entry[1] = entry[2] if entry[0] == window - 1 else 0
+            entry[2] = 0
+            entry[0] = window
+        previous, current = entry[1], entry[2]
+        if current >= limit or (previous and previous * (window + 1 - position) + current >= limit):
+            return retry_after(previous, current, limit, period, (position - window) * period)
+        entry[2] = current + 1
+        return None
+
+    async def ahit(self, key, limit, period, now):
+        # Nothing here blocks
+        return self.hit(key, limit, period, now)
+
+    def _evict(self):
+        try:
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+        except KeyError:
+            pass
+
+    def clear(self):
+        self._windows = OrderedDict()
+
+
+class CacheStore:
+    """Counters in a Django cache, shared by every process using it."""
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    def _keys(self, key, period, now):
+        window, offset = divmod(now, period)
+        # key is (endpoint, ip)
+        prefix = f"ratelimit:{':'.join(key)}:{period}"
+        return f'{prefix}:{int(window) - 1}', f'{prefix}:{int(window)}', offset
+
+    def hit(self, key, limit, period, now):
+        cache = caches[self.alias]
+        previous_key, current_key, offset = self._keys(key, period, now)
+        counts = cache.get_many([previous_key, current_key])
+        previous, current = counts.get(previous_key, 0), counts.get(current_key, 0)
+        if previous * (1 - offset / period) + current >= limit:
+            return retry_after(previous, current, limit, period, offset)
+        if not cache.add(current_key, 1, timeout=2 * period + 1):
+            try:
+                cache.incr(current_key)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.set(current_key, 1, timeout=2 * period + 1)
+        return None
+
+    async def ahit(self, key, limit, period, now):
+        """hit() through the cache's async API, for async views."""
+        cache = caches[self.alias]
+        previous_key, current_key, offset = self._keys(key, period, now)
+        counts = await cache.aget_many([previous_key, current_key])
+        previous, current = counts.get(previous_key, 0), counts.get(current_key, 0)
+        if previous * (1 - offset / period) + current >= limit:
+            return retry_after(previous, current, limit, period, offset)
+        if not await cache.aadd(current_key, 1, timeout=2 * period + 1):
+            try:
+                await cache.aincr(current_key)
+            except ValueError:
+                # Expired between aadd() and aincr()
+                await cache.aset(current_key, 1, timeout=2 * period + 1)
+        return None
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+STORES = {'memory': MemoryStore, 'cache': CacheStore}
+
+
+class Config:
+    def __init__(self):
+        self.enabled = getattr(settings, 'RATELIMIT_ENABLED', True)
+        self.rates = {
+            name: parse_rate(rate)
+            for name, rate in {**DEFAULT_RATES, **getattr(settings, 'RATELIMITS', {})}.items()
+            if rate
+        }
+        self.proxy_count = getattr(settings, 'RATELIMIT_PROXY_COUNT', 0)
+        store = getattr(settings, 'RATELIMIT_STORE', 'memory')
+        if store == 'cache':
+            self.store = CacheStore(getattr(settings, 'RATELIMIT_CACHE', 'default'))
+        else:
+            self.store = STORES[store]() if store in STORES else import_string(store)()
+
+
+_config = None
+
+
+def config():
+    # Settings are read once, not on every request
+    global _config
+    if _config is None:
+        _config = Config()
+    return _config
+
+
+def _reset_config(setting, **kwargs):
+    global _config
+    if setting.startswith('RATELIMIT'):
+        _config = None
+
+
+setting_changed.connect(_reset_config)
+
+
+def client_ip(request, proxy_count=0):
+    """
+    The client address. Behind ``proxy_count`` trusted proxies it is that many
+    entries from the end of X-Forwarded-For, which the proxies append to.
+    """
+    if proxy_count:
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')
+        if len(forwarded) >= proxy_count:
+            return forwarded[-proxy_count].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _limit(request, name):
+    """(store, key, rate) if ``name`` is limited, else None."""
+    current = config()
+    rate = current.rates.get(name)
+    if not current.enabled or rate is None:
+        return None
+    return current.store, (name, client_ip(request, current.proxy_count)), rate
+
+
+def check(request, name):
+    """None if ``request`` may go ahead, else a 429 response."""
+    limit = _limit(request, name)
+    if limit is None:
+        return None
+    store, key, rate = limit
+    return _denied(key, store.hit(key, rate[0], rate[1], time.time()))
+
+
+async def acheck(request, name):
+    """check() for async views."""
+    limit = _limit(request, name)
+    if limit is None:
+        return None
+    store, key, rate = limit
+    hit = getattr(store, 'ahit', None) or sync_to_async(store.hit)
+    return _denied(key, await hit(key, rate[0], rate[1], time.time()))
+
+
+def _denied(key, wait):
+    if wait is None:
+        return None
+    logger.info("Rate limited %s from %s", *key)
+    response = HttpResponse('Too many requests. Please try again later.', status=429, content_type='text/plain')
+    response['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+
+def ratelimit(name, methods=('POST',), condition=None):
+    """
+    Limit a sync or async view to the ``name`` rate per client IP. Only
+    requests using one of ``methods`` (and, if given, for which
+    ``condition(request)`` is true) are counted.
+    """
+
+    def counted(request):
+        return request.method in methods and (condition is None or condition(request))
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def limited(request, *args, **kwargs):
+                if counted(request):
+                    denied = await acheck(request, name)
+                    if denied is not None:
+                        return denied
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def limited(request, *args, **kwargs):
+                if counted(request):
+                    denied = check(request, name)
+                    if denied is not None:
+                        return denied
+                return view(request, *args, **kwargs)
+        return limited
+
+    return decorator
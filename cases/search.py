@@ -0,0 +1,213 @@
+"""
+Full-text search over case titles, descriptions and officer notes.
+
+On SQLite the documents live in the ``cases_search`` FTS5 virtual table,
+created by migration 0008 and kept in sync by signals. Each case and each
+note is one row with a deterministic rowid (2 * case pk, 2 * note pk + 1) so
+updates and deletes are single-row operations. On PostgreSQL the same search
+runs against GIN-indexed tsvector expressions instead. Other backends fall
+back to icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Case, OfficerNote
+
+FTS_TABLE = 'cases_search'
+
+# Column weights for bm25(): case_id (unindexed), ob_number, title, body
+BM25_WEIGHTS = (0.0, 10.0, 4.0, 1.0)
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# Private-use markers that cannot appear in escaped output
+_HIT_START, _HIT_END = '\ue000', '\ue001'
+
+
+class SearchResult:
+    def __init__(self, case, snippet=''):
+        self.case = case
+        self.snippet = snippet
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def tokens(query):
+    return TOKEN.findall(query or '')[:8]
+
+
+def _case_rowid(case_id):
+    return case_id * 2
+
+
+def _note_rowid(note_id):
+    return note_id * 2 + 1
+
+
+def index_case(case):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, case_id, ob_number, title, body) VALUES (%s, %s, %s, %s, %s)',
+            [_case_rowid(case.pk), case.pk, case.ob_number, case.title, case.description],
+        )
+
+
+def index_note(note):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, case_id, ob_number, title, body) VALUES (%s, %s, %s, %s, %s)',
+            [_note_rowid(note.pk), note.case_id, '', '', note.note],
+        )
+
+
+def unindex_case(case_id):
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [_case_rowid(case_id)])
+
+
+def unindex_note(note_id):
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [_note_rowid(note_id)])
+
+
+def reindex_cases(case_ids, chunk_size=500):
+    """Re-index the given cases and all of their notes, e.g. after bulk writes."""
+    if not fts_available():
+        return
+    case_ids = list(case_ids)
+    for start in range(0, len(case_ids), chunk_size):
+        chunk = case_ids[start:start + chunk_size]
+        for case in Case.objects.filter(pk__in=chunk).only('pk', 'ob_number', 'title', 'description'):
+            index_case(case)
+        for note in OfficerNote.objects.filter(case_id__in=chunk).only('pk', 'case_id', 'note'):
+            index_note(note)
+
+
+def rebuild_index():
+    """Drop every document and index all cases and notes again in bulk."""
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, case_id, ob_number, title, body) '
+            f'SELECT id * 2, id, ob_number, title, description FROM {Case._meta.db_table}'
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, case_id, ob_number, title, body) '
+            f"SELECT id * 2 + 1, case_id, '', '', note FROM {OfficerNote._meta.db_table}"
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def _highlight(snippet):
+    return mark_safe(escape(snippet).replace(_HIT_START, '<mark>').replace(_HIT_END, '</mark>'))
+
+
+def ob_prefix_matches(prefix, limit):
+    """Cases whose OB number starts with ``prefix``, as a range on the unique index."""
+    return list(
+        Case.objects.filter(ob_number__gte=prefix, ob_number__lt=prefix + '\U0010ffff').order_by('ob_number')[:limit]
+    )
+
+
+def _search_sqlite(words, limit):
+    match = ' '.join(f'"{word}"*' for word in words)
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    with connection.cursor() as cursor:
+        # Over-fetch documents: several notes of one case can all match
+        cursor.execute(
+            f'SELECT case_id, snippet({FTS_TABLE}, -1, %s, %s, %s, 16) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s',
+            [_HIT_START, _HIT_END, '…', match, limit * 5],
+        )
+        hits = cursor.fetchall()
+    ranked = {}
+    for case_id, snippet in hits:
+        if case_id not in ranked:
+            ranked[case_id] = snippet
+    return list(ranked.items())[:limit]
+
+
+def _search_postgres(words, limit):
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    query = SearchQuery(' & '.join(f"{word}:*" for word in words), search_type='raw', config='simple')
+    cases = (
+        Case.objects.annotate(document=case_vector())
+        .filter(document=query)
+        .annotate(rank=SearchRank(case_vector(), query))
+        .order_by('-rank')
+        .values_list('pk', 'rank')[:limit]
+    )
+    notes = (
+        OfficerNote.objects.annotate(document=note_vector())
+        .filter(document=query)
+        .annotate(rank=SearchRank(note_vector(), query))
+        .order_by('-rank')
+        .values_list('case_id', 'rank')[:limit * 5]
+    )
+    ranked = {}
+    for case_id, rank in sorted([*cases, *notes], key=lambda hit: -hit[1]):
+        ranked.setdefault(case_id, '')
+    return list(ranked.items())[:limit]
+
+
+def case_vector():
+    # Must match the expression indexed by migration 0008 on PostgreSQL
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector('ob_number', 'title', 'description', config='simple')
+
+
+def note_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector('note', config='simple')
+
+
+def _search_fallback(words, limit):
+    matches = Case.objects.all()
+    for word in words:
+        matches = matches.filter(Q(title__icontains=word) | Q(description__icontains=word))
+    return [(pk, '') for pk in matches.values_list('pk', flat=True)[:limit]]
+
+
+def search_cases(query, limit=25):
+    """
+    Ranked cases matching ``query``. OB-number prefix matches come first,
+    followed by full-text hits on titles, descriptions and officer notes.
+    """
+    query = (query or '').strip()
+    results = [SearchResult(case) for case in ob_prefix_matches(query, limit)] if query else []
+    words = tokens(query)
+    if not words or len(results) >= limit:
+        return results
+
+    if connection.vendor == 'sqlite':
+        hits = _search_sqlite(words, limit)
+    elif connection.vendor == 'postgresql':
+        hits = _search_postgres(words, limit)
+    else:
+        hits = _search_fallback(words, limit)
+
+    seen = {result.case.pk for result in results}
+    cases = Case.objects.in_bulk([case_id for case_id, _ in hits if case_id not in seen])
+    for case_id, snippet in hits:
+        if case_id in cases and len(results) < limit:
+            results.append(SearchResult(cases[case_id], _highlight(snippet) if snippet else ''))
+    return results
@@ -0,0 +1,213 @@
+"""
+Signal receivers that keep derived tables in step with Case writes.
+"""
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from . import buffers, cache as page_cache, search, tracking
+from .lookup import ob_numbers
+from .models import Case, CitizenProfile, NotificationSubscription, OfficerNote
+from .stats import adjust_status_counter, rebuild_status_counters
+
+# Sent after bulk writes that bypass model signals (bulk_create, bulk_update,
+# queryset.update). ``case_ids`` lists the affected cases, or is None when too
+# many changed to enumerate and derived tables should be rebuilt outright.
+# ``fields``, if given, limits the refresh to what those columns feed.
+# ``status_deltas`` ({status: change in count}), if given with ``case_ids``,
+# is applied to the status counters instead of recounting every case.
+bulk_cases_changed = Signal()
+
+_UNKNOWN = object()
+
+# Loaded values the receivers below compare against
+_COMPARED_FIELDS = ('status', 'id_number')
+
+
+def _saves(field, update_fields):
+    return update_fields is None or field in update_fields
+
+
+def _loaded(instance, field):
+    return getattr(instance, '_loaded_values', {}).get(field, _UNKNOWN)
+
+
+@receiver(pre_save, sender=Case)
+def remember_stored_values(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Instances not loaded through from_db (or with fields deferred) need one
+    # lookup so receivers know what the save is changing.
+    if raw or instance._state.adding:
+        return
+    missing = [
+        field for field in _COMPARED_FIELDS
+        if _saves(field, update_fields) and _loaded(instance, field) is _UNKNOWN
+    ]
+    if missing:
+        stored = Case.objects.filter(pk=instance.pk).values(*missing).first() or {}
+        instance._loaded_values = {**getattr(instance, '_loaded_values', {}), **stored}
+
+
+@receiver(post_save, sender=Case)
+def update_status_counters(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _saves('status', update_fields):
+        return
+    previous = None if created else _loaded(instance, 'status')
+    if previous is _UNKNOWN:
+        previous = None
+    if previous != instance.status:
+        if previous:
+            adjust_status_counter(previous, -1)
+        adjust_status_counter(instance.status, 1)
+
+
+@receiver(post_save, sender=Case)
+def update_id_number_tracking(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _saves('id_number', update_fields):
+        return
+    previous = None if created else _loaded(instance, 'id_number')
+    if previous is _UNKNOWN:
+        previous = None
+    if previous != instance.id_number:
+        tracking.case_id_number_changed(instance, previous)
+
+
+@receiver(post_save, sender=Case)
+def refresh_loaded_values(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Registered last so the receivers above still see the pre-save values.
+    # Columns left out of update_fields keep their loaded value.
+    instance._loaded_values = {
+        **getattr(instance, '_loaded_values', {}),
+        **{
+            field: instance.__dict__[field] for field in Case.LOADED_FIELDS
+            if field in instance.__dict__ and _saves(field, update_fields)
+        },
+    }
+
+
+@receiver(post_save, sender=Case)
+def add_ob_number(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and _saves('ob_number', update_fields):
+        ob_numbers.case_saved(instance.pk, instance.ob_number)
+
+
+@receiver(post_delete, sender=Case)
+def drop_ob_number(sender, instance, **kwargs):
+    ob_numbers.case_deleted(instance.pk, instance.ob_number)
+
+
+@receiver(post_delete, sender=Case)
+def release_status_counter(sender, instance, **kwargs):
+    status = _loaded(instance, 'status')
+    adjust_status_counter(instance.status if status is _UNKNOWN else status, -1)
+
+
+@receiver(post_save, sender=NotificationSubscription)
+def track_subscription(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        tracking.subscription_added(instance.case_id, instance.email)
+        transaction.on_commit(partial(buffers.subscriptions.remember, instance.case_id, instance.email))
+
+
+@receiver(post_delete, sender=NotificationSubscription)
+def untrack_subscription(sender, instance, **kwargs):
+    tracking.subscription_removed(instance.case_id, instance.email)
+    # Let a later lookup subscribe the pair again
+    buffers.subscriptions.forget(instance.case_id, instance.email)
+
+
+@receiver(post_save, sender=CitizenProfile)
+def sync_profile_tracking(sender, instance, raw=False, **kwargs):
+    if not raw:
+        tracking.sync_user(instance.user)
+
+
+@receiver(post_delete, sender=CitizenProfile)
+def untrack_profile_cases(sender, instance, **kwargs):
+    tracking.profile_removed(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def sync_user_tracking(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Logins save last_login only; just email changes affect tracking
+    if raw or not _saves('email', update_fields):
+        return
+    tracking.sync_user(instance)
+
+
+@receiver(bulk_cases_changed)
+def rebuild_after_bulk_write(sender, case_ids=None, fields=None, status_deltas=None, **kwargs):
+    def touched(*names):
+        return fields is None or bool(set(names) & set(fields))
+
+    if touched('status'):
+        if case_ids is not None and status_deltas is not None:
+            for status, delta in status_deltas.items():
+                if delta:
+                    adjust_status_counter(status, delta)
+        else:
+            rebuild_status_counters()
+    if touched('ob_number'):
+        ob_numbers.cases_changed(case_ids)
+    if case_ids is None:
+        if touched('id_number'):
+            tracking.rebuild_all()
+        if touched('ob_number', 'title', 'description'):
+            search.rebuild_index()
+        page_cache.clear()
+    else:
+        if touched('id_number'):
+            tracking.sync_cases(case_ids)
+        if touched('ob_number', 'title', 'description'):
+            search.reindex_cases(case_ids)
+        for pk in case_ids:
+            page_cache.invalidate_case(pk)
+
+
+@receiver(post_save, sender=Case)
+def index_case_for_search(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is None or {'ob_number', 'title', 'description'} & set(update_fields):
+        search.index_case(instance)
+
+
+@receiver(post_delete, sender=Case)
+def unindex_case_for_search(sender, instance, **kwargs):
+    search.unindex_case(instance.pk)
+
+
+@receiver(post_save, sender=OfficerNote)
+def index_note_for_search(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_note(instance)
+
+
+@receiver(post_delete, sender=OfficerNote)
+def unindex_note_for_search(sender, instance, **kwargs):
+    search.unindex_note(instance.pk)
+
+
+@receiver(post_save, sender=Case)
+@receiver(post_delete, sender=Case)
+def invalidate_case_page(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.invalidate_case(instance.pk)
+
+
+@receiver(post_save, sender=OfficerNote)
+@receiver(post_delete, sender=OfficerNote)
+def invalidate_case_page_for_note(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.invalidate_case(instance.case_id)
+
+
+@receiver(post_save, sender=OfficerNote)
+@receiver(post_delete, sender=OfficerNote)
+def touch_case_for_note(sender, instance, raw=False, **kwargs):
+    # Notes are part of the case page, so they count as a change to the case
+    if not raw:
+        Case.objects.filter(pk=instance.case_id).update(updated_at=timezone.now())
@@ -0,0 +1,43 @@
+"""
+Case status statistics shared by the officer list and the citizen dashboard.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Case, CaseStatusCounter
+
+STATUSES = [status for status, _ in Case.STATUS_CHOICES]
+
+
+def status_counts(queryset):
+    """
+    Total and per-status counts for ``queryset`` in a single
+    conditional-aggregation query.
+    """
+    aggregates = {'total': Count('pk')}
+    for status in STATUSES:
+        aggregates[status] = Count('pk', filter=Q(status=status))
+    return queryset.order_by().aggregate(**aggregates)
+
+
+def global_status_counts():
+    """Headline counts for all cases, read from the maintained counter table."""
+    stored = dict(CaseStatusCounter.objects.values_list('status', 'count'))
+    counts = {status: stored.get(status, 0) for status in STATUSES}
+    return {'total': sum(counts.values()), **counts}
+
+
+def adjust_status_counter(status, delta):
+    updated = CaseStatusCounter.objects.filter(status=status).update(count=F('count') + delta)
+    if not updated:
+        CaseStatusCounter.objects.get_or_create(status=status)
+        CaseStatusCounter.objects.filter(status=status).update(count=F('count') + delta)
+
+
+def rebuild_status_counters():
+    """Recount every status from the Case table, e.g. after bulk writes."""
+    counts = status_counts(Case.objects.all())
+    with transaction.atomic():
+        for status in STATUSES:
+            CaseStatusCounter.objects.update_or_create(status=status, defaults={'count': counts[status]})
+    return counts
@@ -0,0 +1,183 @@
+"""
+Synthetic data generation for load testing.
+
+Rows are written with chunked bulk_create inside one transaction per chunk,
+with realistic status, court-date and subscription distributions, so
+production-sized tables can be reproduced locally in minutes.
+"""
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Case, OfficerNote, NotificationSubscription
+from .signals import bulk_cases_changed
+
+# Share of cases in each status; most OB entries never leave investigation
+STATUS_WEIGHTS = {
+    'investigation': 0.45,
+    'dci': 0.20,
+    'court': 0.20,
+    'judgement': 0.15,
+}
+
+NOTE_TEMPLATES = [
+    'Statement recorded from the complainant.',
+    'Witness statements recorded.',
+    'Suspect identified via CCTV footage.',
+    'File forwarded to the DCI for further investigation.',
+    'Medical report received.',
+    'Exhibits submitted to the government chemist.',
+    'Charge sheet prepared and forwarded to the ODPP.',
+    'Mention date set by the court.',
+    'Hearing adjourned at the request of the defence.',
+    'Judgement delivered.',
+]
+
+TITLES = [
+    'Theft at {place}', 'Assault - {place}', 'Traffic incident on {place} road',
+    'Burglary in {place}', 'Fraud reported in {place}', 'Malicious damage in {place}',
+]
+
+PLACES = ['Central Market', 'Westlands', 'Kibera', 'Eastleigh', 'Thika', 'Kisumu', 'Nakuru', 'Mombasa Road']
+
+
+def subscriber_email(index):
+    return f'subscriber{index}@example.com'
+
+
+def citizen_id_number(index):
+    return f'ID{index:08d}'
+
+
+def bulk_create_with_timestamps(model, objs, fields, batch_size=None, **kwargs):
+    """
+    bulk_create() ``objs`` keeping the values they were built with for the
+    auto_now/auto_now_add ``fields``, which bulk_create() stamps with the
+    current time. Those values are written back with bulk_update() in the
+    caller's transaction; objects without one keep the current time.
+    """
+    saved = [(obj, {name: getattr(obj, name) for name in fields}) for obj in objs]
+    created = model.objects.bulk_create(objs, batch_size=batch_size, **kwargs)
+    stamped = []
+    for obj, values in saved:
+        values = {name: value for name, value in values.items() if value is not None}
+        if values:
+            for name, value in values.items():
+                setattr(obj, name, value)
+            stamped.append(obj)
+    unique_fields = kwargs.get('unique_fields')
+    if unique_fields and any(obj.pk is None for obj in stamped):
+        # Backends that cannot return ids from an upsert
+        key = unique_fields[0]
+        pks = dict(model.objects.filter(**{f'{key}__in': [getattr(obj, key) for obj in stamped]}).values_list(key, 'pk'))
+        for obj in stamped:
+            obj.pk = pks.get(getattr(obj, key))
+    stamped = [obj for obj in stamped if obj.pk is not None]
+    if stamped:
+        model.objects.bulk_update(stamped, fields, batch_size=batch_size)
+    return created
+
+
+class Generator:
+    def __init__(self, seed=None, chunk_size=5000, days=730, stdout=None):
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.days = days
+        self.stdout = stdout
+        self.now = timezone.now()
+        self.statuses = list(STATUS_WEIGHTS)
+        self.weights = list(STATUS_WEIGHTS.values())
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def build_case(self, index, prefix):
+        rng = self.rng
+        created_at = self.now - timedelta(seconds=rng.randint(0, self.days * 86400))
+        status = rng.choices(self.statuses, self.weights)[0]
+        court_date = None
+        if status == 'court':
+            court_date = self.now + timedelta(days=rng.randint(-7, 120), hours=rng.choice([9, 10, 11, 14]))
+        elif status == 'judgement':
+            court_date = created_at + timedelta(days=rng.randint(30, 400))
+            court_date = min(court_date, self.now - timedelta(days=1))
+        return Case(
+            ob_number=f'{prefix}/{created_at.year}/{index:07d}',
+            title=rng.choice(TITLES).format(place=rng.choice(PLACES)),
+            description='Synthetic case generated for load testing.',
+            status=status,
+            court_date=court_date,
+            created_at=created_at,
+            # Roughly one case in five is linked to a registered citizen
+            id_number=citizen_id_number(rng.randint(0, 9999)) if rng.random() < 0.2 else None,
+        )
+
+    def build_notes(self, case, notes_per_case):
+        rng = self.rng
+        count = rng.randint(0, notes_per_case * 2) if notes_per_case else 0
+        age = max((self.now - case.created_at).total_seconds(), 1)
+        return [
+            OfficerNote(
+                case=case,
+                note=rng.choice(NOTE_TEMPLATES),
+                created_at=case.created_at + timedelta(seconds=rng.uniform(0, age)),
+            )
+            for _ in range(count)
+        ]
+
+    def generate_cases(self, total, notes_per_case, prefix='OB'):
+        """Create ``total`` cases with notes; returns the created case ids."""
+        case_ids = []
+        for start in range(0, total, self.chunk_size):
+            batch = [self.build_case(i, prefix) for i in range(start, min(start + self.chunk_size, total))]
+            notes = []
+            for case in batch:
+                case_notes = self.build_notes(case, notes_per_case)
+                # As if the last note was the case's last change
+                case.updated_at = max([case.created_at, *(note.created_at for note in case_notes)])
+                notes.extend(case_notes)
+            with transaction.atomic():
+                bulk_create_with_timestamps(Case, batch, ['created_at', 'updated_at'], batch_size=self.chunk_size)
+                bulk_create_with_timestamps(OfficerNote, notes, ['created_at'], batch_size=self.chunk_size)
+            case_ids.extend(case.pk for case in batch)
+            self.log(f'  {len(case_ids)}/{total} cases')
+        return case_ids
+
+    def generate_subscriptions(self, total, case_ids):
+        """
+        Create about ``total`` subscriptions. Popular cases attract most of
+        them (Pareto-distributed) and each address follows several cases.
+        """
+        if not case_ids or not total:
+            return 0
+        rng = self.rng
+        emails = max(total // 3, 1)
+        created = 0
+        while created < total:
+            size = min(self.chunk_size, total - created)
+            batch = []
+            for _ in range(size):
+                rank = min(int(rng.paretovariate(1.2)) - 1, len(case_ids) - 1)
+                case_id = case_ids[rank] if rng.random() < 0.3 else rng.choice(case_ids)
+                batch.append(NotificationSubscription(case_id=case_id, email=subscriber_email(rng.randrange(emails))))
+            with transaction.atomic():
+                NotificationSubscription.objects.bulk_create(batch, batch_size=self.chunk_size, ignore_conflicts=True)
+            created += size
+            self.log(f'  {created}/{total} subscriptions')
+        return created
+
+
+def generate(cases, notes_per_case=5, subscribers=0, seed=None, chunk_size=5000, prefix='OB', stdout=None):
+    """
+    Generate a synthetic dataset and refresh the tables derived from cases.
+    Returns the ids of the created cases.
+    """
+    generator = Generator(seed=seed, chunk_size=chunk_size, stdout=stdout)
+    case_ids = generator.generate_cases(cases, notes_per_case, prefix=prefix)
+    generator.generate_subscriptions(subscribers, case_ids)
+    # bulk_create bypasses model signals
+    bulk_cases_changed.send(sender=Case, case_ids=None)
+    return case_ids
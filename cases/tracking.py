@@ -0,0 +1,145 @@
+"""
+Maintenance of the TrackedCase relation.
+
+A user tracks a case when one of the case's NotificationSubscriptions uses
+the user's email, or when the case's id_number matches the user's
+CitizenProfile. Each TrackedCase row records which of those applies and is
+removed once neither does.
+"""
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from .models import Case, CitizenProfile, NotificationSubscription, TrackedCase
+
+
+def _apply(user_id, case_ids, flag, value):
+    """Set ``flag`` to ``value`` on (user, case) rows, creating or pruning as needed."""
+    case_ids = set(case_ids)
+    if not case_ids:
+        return
+    rows = TrackedCase.objects.filter(user_id=user_id, case_id__in=case_ids)
+    if value:
+        existing = set(rows.values_list('case_id', flat=True))
+        rows.filter(**{flag: False}).update(**{flag: True})
+        TrackedCase.objects.bulk_create(
+            [TrackedCase(user_id=user_id, case_id=case_id, **{flag: True}) for case_id in case_ids - existing],
+            ignore_conflicts=True,
+        )
+    else:
+        rows.update(**{flag: False})
+        rows.filter(via_subscription=False, via_id_number=False).delete()
+
+
+def sync_user(user):
+    """Recompute every tracked case for one user from scratch."""
+    subscribed = set()
+    if user.email:
+        subscribed = set(
+            NotificationSubscription.objects.filter(email=user.email).values_list('case_id', flat=True)
+        )
+    linked = set()
+    id_number = CitizenProfile.objects.filter(user=user).values_list('id_number', flat=True).first()
+    if id_number:
+        linked = set(Case.objects.filter(id_number=id_number).values_list('pk', flat=True))
+
+    with transaction.atomic():
+        current = {
+            case_id: (sub, idn)
+            for case_id, sub, idn in TrackedCase.objects.filter(user=user).values_list(
+                'case_id', 'via_subscription', 'via_id_number'
+            )
+        }
+        wanted = {case_id: (case_id in subscribed, case_id in linked) for case_id in subscribed | linked}
+        stale = [case_id for case_id in current if case_id not in wanted]
+        if stale:
+            TrackedCase.objects.filter(user=user, case_id__in=stale).delete()
+        TrackedCase.objects.bulk_create([
+            TrackedCase(user=user, case_id=case_id, via_subscription=sub, via_id_number=idn)
+            for case_id, (sub, idn) in wanted.items() if case_id not in current
+        ])
+        for case_id, (sub, idn) in wanted.items():
+            if case_id in current and current[case_id] != (sub, idn):
+                TrackedCase.objects.filter(user=user, case_id=case_id).update(
+                    via_subscription=sub, via_id_number=idn
+                )
+
+
+def subscription_added(case_id, email):
+    for user_id in User.objects.filter(email=email).values_list('pk', flat=True):
+        _apply(user_id, [case_id], 'via_subscription', True)
+
+
+def subscriptions_added(pairs):
+    """subscription_added() for many (case_id, email) pairs, one _apply per user."""
+    case_ids = defaultdict(set)
+    for case_id, email in pairs:
+        case_ids[email].add(case_id)
+    for user_id, email in User.objects.filter(email__in=case_ids).values_list('pk', 'email'):
+        _apply(user_id, case_ids[email], 'via_subscription', True)
+
+
+def subscription_removed(case_id, email):
+    if NotificationSubscription.objects.filter(case_id=case_id, email=email).exists():
+        return
+    for user_id in User.objects.filter(email=email).values_list('pk', flat=True):
+        _apply(user_id, [case_id], 'via_subscription', False)
+
+
+def case_id_number_changed(case, previous_id_number):
+    """Move the ID-number link of ``case`` from the previous owner to the new one."""
+    if previous_id_number:
+        previous_owner = CitizenProfile.objects.filter(id_number=previous_id_number).values_list('user_id', flat=True).first()
+        if previous_owner:
+            _apply(previous_owner, [case.pk], 'via_id_number', False)
+    if case.id_number:
+        owner = CitizenProfile.objects.filter(id_number=case.id_number).values_list('user_id', flat=True).first()
+        if owner:
+            _apply(owner, [case.pk], 'via_id_number', True)
+
+
+def profile_removed(user_id):
+    """Drop ID-number links for a user whose CitizenProfile was deleted."""
+    rows = TrackedCase.objects.filter(user_id=user_id)
+    rows.filter(via_id_number=True).update(via_id_number=False)
+    rows.filter(via_subscription=False, via_id_number=False).delete()
+
+
+def sync_cases(case_ids, chunk_size=500):
+    """Recompute tracking for every user connected to the given cases."""
+    case_ids = list(case_ids)
+    user_ids = set()
+    for start in range(0, len(case_ids), chunk_size):
+        chunk = case_ids[start:start + chunk_size]
+        emails = NotificationSubscription.objects.filter(case_id__in=chunk).values('email')
+        id_numbers = Case.objects.filter(pk__in=chunk, id_number__isnull=False).values('id_number')
+        user_ids.update(
+            User.objects.filter(
+                Q(email__in=emails)
+                | Q(citizen_profile__id_number__in=id_numbers)
+                | Q(tracked_cases__case_id__in=chunk)
+            ).values_list('pk', flat=True)
+        )
+    for user in User.objects.filter(pk__in=user_ids).iterator():
+        sync_user(user)
+
+
+def rebuild_all():
+    """Recompute tracked cases for every user, e.g. after bulk imports."""
+    count = 0
+    for user in User.objects.iterator():
+        sync_user(user)
+        count += 1
+    return count
+
+
+def tracked_cases_version(user):
+    """
+    A cheap version of the user's tracked cases: it changes when any of them
+    is updated and when cases are added to or dropped from the set.
+    """
+    return TrackedCase.objects.filter(user=user).aggregate(
+        latest=Max('case__updated_at'), count=Count('pk'), last=Max('pk')
+    )
@@ -0,0 +1,136 @@
+"""
+Case status transitions.
+
+save_case() saves an officer's edit to one case, writing only the columns
+that changed since the case was loaded; a status or court date change is
+appended to the CaseStatusEvent history and queued for subscribers.
+
+A court sitting can move dozens of cases at once. bulk_transition() locks the
+cases, applies the new status and/or court date with a single bulk_update,
+records one CaseStatusEvent per changed case and queues one outbox row for
+the whole change. The notification worker turns that row into a single
+digest per subscriber listing every affected case they follow.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from .events import publish_status_change
+from .models import Case, CaseStatusEvent, NotificationOutbox
+from .notifications import queue_case_notification
+from .signals import bulk_cases_changed
+
+# Marker for "leave the court date alone"; None clears it
+UNCHANGED = object()
+
+
+def save_case(case, user=None, notify=True):
+    """
+    Save an edited ``case`` with update_fields limited to what changed since
+    it was loaded. Returns the CaseStatusEvent recorded, or None if neither
+    status nor court date changed.
+    """
+    changed = case.changed_fields()
+    if not changed:
+        return None
+    event = None
+    with transaction.atomic():
+        if 'status' in changed or 'court_date' in changed:
+            missing = [name for name in ('status', 'court_date') if case.loaded_value(name, UNCHANGED) is UNCHANGED]
+            stored = Case.objects.filter(pk=case.pk).values(*missing).first() if missing else {}
+            event = CaseStatusEvent(
+                case=case,
+                old_status=stored.get('status', case.loaded_value('status')),
+                new_status=case.status,
+                old_court_date=stored.get('court_date', case.loaded_value('court_date')),
+                new_court_date=case.court_date,
+                changed_by=user,
+            )
+            if notify:
+                event.outbox = queue_case_notification(case, *_describe(case, event))
+            # Written before the case so the page cache, invalidated by the
+            # case save, is never rebuilt without it
+            event.save()
+        case.save(update_fields=[*changed, 'updated_at'])
+        if event is not None:
+            publish_status_change(case)
+    return event
+
+
+def _describe(case, event):
+    """Subject and body of the notification for a single case edit."""
+    subject_parts = []
+    body_parts = [f"Case {case.ob_number} - {case.title} has been updated."]
+    if event.old_status != event.new_status:
+        subject_parts.append("status change")
+        body_parts.append(f"New status: {case.get_status_display()}")
+    if event.old_court_date != event.new_court_date:
+        subject_parts.append("court date update")
+        new_date = case.court_date.isoformat() if case.court_date else "Removed"
+        body_parts.append(f"Court date: {new_date}")
+    return f"HakiFlow: {case.ob_number} {' & '.join(subject_parts)}", "\n".join(body_parts)
+
+
+def bulk_transition(cases, status=None, court_date=UNCHANGED, user=None, notify=True):
+    """
+    Move ``cases`` (a queryset or iterable of cases or pks) to ``status``
+    and/or ``court_date`` in one transaction. Cases already in the target
+    state are left untouched. Returns the CaseStatusEvent rows created.
+    """
+    if status is not None and status not in dict(Case.STATUS_CHOICES):
+        raise ValueError(f'Unknown case status: {status}')
+    if hasattr(cases, 'values_list'):
+        pks = list(cases.values_list('pk', flat=True))
+    else:
+        pks = [getattr(case, 'pk', case) for case in cases]
+
+    now = timezone.now()
+    with transaction.atomic():
+        locked = Case.objects.select_for_update().filter(pk__in=pks).only('pk', 'ob_number', 'status', 'court_date').order_by('pk')
+        changed = []
+        events = []
+        for case in locked:
+            event = CaseStatusEvent(
+                case=case,
+                old_status=case.status,
+                new_status=case.status if status is None else status,
+                old_court_date=case.court_date,
+                new_court_date=case.court_date if court_date is UNCHANGED else court_date,
+                changed_by=user,
+            )
+            if (event.old_status, event.old_court_date) == (event.new_status, event.new_court_date):
+                continue
+            case.status = event.new_status
+            case.court_date = event.new_court_date
+            case.updated_at = now
+            changed.append(case)
+            events.append(event)
+        if not changed:
+            return []
+
+        Case.objects.bulk_update(changed, ['status', 'court_date', 'updated_at'])
+        if notify:
+            outbox = NotificationOutbox.objects.create(
+                case=None,
+                subject='HakiFlow: case updates',
+                body=f"{len(changed)} case(s) were updated.",
+            )
+            for event in events:
+                event.outbox = outbox
+        CaseStatusEvent.objects.bulk_create(events)
+        for case in changed:
+            publish_status_change(case)
+        status_deltas = Counter()
+        for event in events:
+            if event.old_status != event.new_status:
+                status_deltas[event.old_status] -= 1
+                status_deltas[event.new_status] += 1
+        # bulk_update bypasses model signals
+        bulk_cases_changed.send(
+            sender=Case,
+            case_ids=[case.pk for case in changed],
+            fields=['status', 'court_date'],
+            status_deltas=dict(status_deltas),
+        )
+    return events
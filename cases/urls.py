@@ -1,22 +1,36 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Public URLs
     path('', views.home_view, name='home'),
     path('case/<int:pk>/', views.case_detail_view, name='case_detail'),
+    path('case/<int:pk>/events/', views.case_event_stream, name='case_events'),
+    path('case/<int:pk>/calendar.ics', views.case_calendar_feed, name='case_calendar_feed'),
+    path('calendar/<str:token>.ics', views.user_calendar_feed, name='user_calendar_feed'),
+    path('search/', views.search_view, name='search'),
     path('report/', views.report_view, name='report'),
     path('subscribe/', views.subscribe_view, name='subscribe'),
 
     # Officer/Admin URLs
     path('cases/', views.CaseListView.as_view(), name='case_list'),
     path('cases/add/', views.CaseCreateView.as_view(), name='case_add'),
+    path('cases/calendar/', views.court_calendar_view, name='court_calendar'),
+    path('cases/import/', views.import_cases_view, name='import_cases'),
+    path('cases/export/', views.export_cases_csv, name='export_cases'),
+    path('reports/', views.report_triage_view, name='report_triage'),
+    path('ops/query-stats/', views.query_stats_view, name='query_stats'),
     path('cases/<int:pk>/edit/', views.CaseUpdateView.as_view(), name='case_edit'),
     path('cases/<int:pk>/add-note/', views.OfficerNoteCreateView.as_view(), name='add_note'),
     
+    # JSON API
+    path('api/cases/batch/', api.case_batch_view, name='api_case_batch'),
+    path('api/cases/changes/', api.case_changes_view, name='api_case_changes'),
+
     # Auth & Dashboard URLs
     path('signup/', views.SignUpView.as_view(), name='signup'),
     path('dashboard/', views.UserDashboardView.as_view(), name='user_dashboard'),
+    path('dashboard/events/', views.user_event_stream, name='user_events'),
     path('dashboard/export/', views.export_user_cases_csv, name='export_user_cases'),
     path('notifications/', views.NotificationManagementView.as_view(), name='notification_management'),
 ]
@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, CreateView, UpdateView, TemplateView
 from django.urls import reverse_lazy
@@ -5,80 +6,181 @@ from django.contrib import messages
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django import forms
+from django.db import IntegrityError
+from django.db.models import Q
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
-from .models import Case, OfficerNote, NotificationSubscription, AnonymousReport, CitizenProfile
+import csv
+import io
+from .models import Case, OfficerNote, NotificationSubscription, AnonymousReport, CitizenProfile, TrackedCase
+from . import events
+from .buffers import reports as report_buffer, subscriptions as subscription_buffer
+from .cache import aget_case_page
+from .conditional import make_etag, not_modified, page_etag, set_validators
+from .court_calendar import (
+    calendar_token, day_bounds, feed_etag, feed_rows, hearings, render_ics, user_id_for_token,
+)
+from .exports import case_csv_response
+from .importer import CaseImporter, detect_format, read_rows
+from .lookup import ob_numbers
+from .middleware import stats as query_stats
+from .notifications import queue_case_notification
+from .pagination import KeysetPaginator
+from .ratelimit import ratelimit
+from .search import search_cases
+from .stats import status_counts, global_status_counts
+from .tracking import tracked_cases_version
+from .transitions import save_case
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_protect
-import csv
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 
 
-def send_case_notifications(case, subject, body):
-    """
-    Send a notification email to all subscribers of a case.
-    If email backend is not configured, silently skip to avoid crashing user flows.
-    """
-    recipients = list(NotificationSubscription.objects.filter(case=case).values_list("email", flat=True).distinct())
-    if not recipients:
-        return
-    try:
-        send_mail(
-            subject=subject,
-            message=body,
-            from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
-            recipient_list=recipients,
-            fail_silently=True,  # Avoid breaking UX if SMTP isn't configured
-        )
-    except Exception:
-        # Keep silent to avoid user-facing failures; logs can be added later
-        pass
-
 # Public Views
 
-def home_view(request):
+# Only OB lookups count: plain visits from a shared carrier IP must not use up the budget
+@ratelimit('home', methods=('GET',), condition=lambda request: bool(request.GET.get('q')))
+async def home_view(request):
     query = request.GET.get('q')
     if query:
-        case = Case.objects.filter(ob_number=query).first()
-        if case:
-            # Auto-subscribe authenticated users with an email
-            if request.user.is_authenticated and request.user.email:
-                NotificationSubscription.objects.get_or_create(case=case, email=request.user.email)
-            return redirect('case_detail', pk=case.pk)
+        # Unknown OB numbers are mostly answered without a query
+        pk = await ob_numbers.aresolve(query)
+        if pk:
+            # Auto-subscribe authenticated users with an email; written later in bulk
+            user = await request.auser()
+            if user.is_authenticated and user.email:
+                subscription_buffer.add(pk, user.email)
+            return redirect('case_detail', pk=pk)
         else:
             messages.error(request, 'Case not found with that OB Number.')
-    return render(request, 'cases/home.html')
-
-def case_detail_view(request, pk):
-    case = get_object_or_404(Case, pk=pk)
-    return render(request, 'cases/case_detail.html', {'case': case})
+    # Templates read request.user and the session, which hit the database
+    return await sync_to_async(render)(request, 'cases/home.html')
+
+async def case_detail_view(request, pk):
+    page = await aget_case_page(pk)
+    if page is None:
+        raise Http404('No case found with that ID.')
+    page = {**page, 'live_updates': events.streaming_supported(request)}
+    # The cached page carries updated_at, so a 304 costs only its freshness check
+    updated_at = page['case'].get('updated_at')
+    if updated_at is None:
+        return await sync_to_async(render)(request, 'cases/case_detail.html', page)
+    etag = page_etag(request, pk, updated_at.isoformat())
+    response = not_modified(request, etag, updated_at)
+    if response is None:
+        response = await sync_to_async(render)(request, 'cases/case_detail.html', page)
+    return set_validators(response, etag, updated_at)
+
+def search_view(request):
+    query = request.GET.get('q', '').strip()
+    results = search_cases(query) if query else []
+    return render(request, 'cases/search_results.html', {'query': query, 'results': results})
+
+def ics_response(request, name, queryset, filename):
+    """
+    Serve ``queryset``'s hearings as an iCalendar feed, or 304 when the
+    client's ETag still matches the rows.
+    """
+    rows = feed_rows(queryset)
+    etag = feed_etag(rows)
+    last_modified = max((row[-1] for row in rows), default=None)
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = HttpResponse(render_ics(name, rows, domain=request.get_host()), content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return set_validators(response, etag, last_modified)
+
+def case_calendar_feed(request, pk):
+    case = Case.objects.filter(pk=pk).only('ob_number').first()
+    if case is None:
+        raise Http404('No case found with that ID.')
+    return ics_response(request, f'HakiFlow {case.ob_number}', Case.objects.filter(pk=pk), f'case-{pk}.ics')
+
+def user_calendar_feed(request, token):
+    """Hearings of every case the token's user tracks; the signed token stands in for a login."""
+    user_id = user_id_for_token(token)
+    if user_id is None:
+        raise Http404('Unknown calendar.')
+    return ics_response(request, 'HakiFlow hearings', Case.objects.filter(trackers__user_id=user_id), 'hearings.ics')
+
+def event_stream_response(request, case_ids):
+    """A Server-Sent Events response following ``case_ids``, resuming after Last-Event-ID."""
+    if not events.streaming_supported(request):
+        # 204 tells EventSource to stop reconnecting
+        return HttpResponse(status=204)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    response = StreamingHttpResponse(events.stream(case_ids, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
+async def case_event_stream(request, pk):
+    # One query to check the case exists; after that the stream only waits on the bus
+    if not await Case.objects.filter(pk=pk).aexists():
+        raise Http404('No case found with that ID.')
+    return event_stream_response(request, [pk])
+
+async def user_event_stream(request):
+    """Live events for every case the user tracks, as of connecting."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    case_ids = [pk async for pk in TrackedCase.objects.filter(user=user).values_list('case_id', flat=True)]
+    return event_stream_response(request, case_ids)
+
+@ratelimit('report')
 def report_view(request):
     if request.method == 'POST':
         details = request.POST.get('details')
         if details:
-            AnonymousReport.objects.create(details=details)
-            messages.success(request, 'Report submitted successfully.')
-            return redirect('home')
+            # Queued and written in batches; repeats of the same text are counted
+            if report_buffer.add(details):
+                messages.success(request, 'Report submitted successfully.')
+                return redirect('home')
+            messages.error(request, 'Reports cannot be accepted right now. Please try again later.')
     return render(request, 'cases/report.html')
 
-def subscribe_view(request):
+@ratelimit('subscribe')
+async def subscribe_view(request):
     if request.method == 'POST':
         ob_number = request.POST.get('ob_number')
         email = request.POST.get('email')
-        case = Case.objects.filter(ob_number=ob_number).first()
-        if case and email:
-            NotificationSubscription.objects.get_or_create(case=case, email=email)
+        frequency = request.POST.get('frequency', 'immediate')
+        if frequency not in dict(NotificationSubscription.FREQUENCY_CHOICES):
+            frequency = 'immediate'
+        pk = await ob_numbers.aresolve(ob_number) if email else None
+        if pk:
+            try:
+                # An existing subscription keeps its frequency: only its owner changes
+                # that, from the notification management page
+                await NotificationSubscription.objects.aget_or_create(case_id=pk, email=email, defaults={'frequency': frequency})
+            except IntegrityError:
+                # The case was deleted by another process since it was cached
+                ob_numbers.discard(ob_number)
+                pk = None
+        if pk:
             messages.success(request, 'Subscribed to updates successfully.')
             return redirect('home')
         else:
             messages.error(request, 'Invalid OB Number or Email.')
-    return render(request, 'cases/subscribe.html')
+    context = {'frequency_choices': NotificationSubscription.FREQUENCY_CHOICES}
+    return await sync_to_async(render)(request, 'cases/subscribe.html', context)
 
+@method_decorator(ratelimit('signup'), name='dispatch')
 class SignUpView(CreateView):
     class SignUpForm(UserCreationForm):
         email = forms.EmailField(required=True, help_text="Add an email to get case alerts.")
@@ -122,97 +224,172 @@ class UserDashboardView(LoginRequiredMixin, ListView):
         if request.method == 'POST':
             ob_number = request.POST.get('ob_number')
             if ob_number:
-                case = Case.objects.filter(ob_number=ob_number).first()
-                if case:
-                    # Auto-subscribe authenticated users with email
+                pk = ob_numbers.resolve(ob_number)
+                if pk:
+                    # Auto-subscribe authenticated users with email; written later in bulk
                     if request.user.is_authenticated and request.user.email:
-                        NotificationSubscription.objects.get_or_create(case=case, email=request.user.email)
+                        subscription_buffer.add(pk, request.user.email)
                     elif request.user.is_authenticated and not request.user.email:
                         messages.warning(request, 'Add an email to receive notifications for this case.')
-                    return redirect('case_detail', pk=case.pk)
+                    return redirect('case_detail', pk=pk)
                 else:
                     messages.error(request, 'No case found with that OB Number.')
         return super().dispatch(request, *args, **kwargs)
 
+    def get(self, request, *args, **kwargs):
+        # Upcoming court dates drop off as they pass, hence the hour in the ETag
+        version = tracked_cases_version(request.user)
+        etag = page_etag(request, *version.values(), timezone.now().strftime('%Y%m%d%H'))
+        response = not_modified(request, etag) or super().get(request, *args, **kwargs)
+        return set_validators(response, etag)
+
     def get_queryset(self):
-        pk_set = set()
-        email = self.request.user.email
-        if email:
-            subscribed_cases = NotificationSubscription.objects.filter(email=email).values_list('case', flat=True)
-            pk_set.update(subscribed_cases)
-        profile = getattr(self.request.user, 'citizen_profile', None)
-        if profile:
-            id_case_ids = Case.objects.filter(id_number=profile.id_number).values_list('pk', flat=True)
-            pk_set.update(id_case_ids)
-        if not pk_set:
-            return Case.objects.none()
-        return Case.objects.filter(pk__in=pk_set)
+        # TrackedCase is maintained by signals (see cases.tracking)
+        return Case.objects.filter(trackers__user=self.request.user)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        qs = self.get_queryset()
-        context['case_counts'] = {
-            'total': qs.count(),
-            'investigation': qs.filter(status='investigation').count(),
-            'dci': qs.filter(status='dci').count(),
-            'court': qs.filter(status='court').count(),
-            'judgement': qs.filter(status='judgement').count()
-        }
+        qs = self.object_list
+        context['case_counts'] = status_counts(qs)
         # Recent notes for user's cases (activity feed)
-        context['recent_notes'] = OfficerNote.objects.filter(case__in=qs).order_by('-created_at')[:10]
+        context['recent_notes'] = OfficerNote.objects.feed().filter(case__trackers__user=self.request.user)[:10]
+        context['live_updates'] = events.streaming_supported(self.request)
         # Upcoming court dates
-        context['upcoming_court_dates'] = qs.filter(court_date__isnull=False).order_by('court_date')[:5]
+        context['upcoming_court_dates'] = qs.filter(court_date__gte=timezone.now()).order_by('court_date')[:5]
+        context['calendar_token'] = calendar_token(self.request.user)
         return context
 
 
 @login_required
 def export_user_cases_csv(request):
     """
-    Export the current user's tracked cases as CSV.
+    Export the current user's tracked cases as CSV, streamed row by row.
+    Pass ?compress=gzip for a gzip-compressed download.
     """
-    qs = Case.objects.none()
-    if request.user.email:
-        subscribed_cases = NotificationSubscription.objects.filter(email=request.user.email).values_list('case', flat=True)
-        qs = Case.objects.filter(pk__in=subscribed_cases)
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename=\"my_cases.csv\"'
-
-    writer = csv.writer(response)
-    writer.writerow(['OB Number', 'Title', 'Status', 'Court Date', 'Created At'])
-    for c in qs:
-        writer.writerow([
-            c.ob_number,
-            c.title,
-            c.get_status_display(),
-            c.court_date.isoformat() if c.court_date else '',
-            c.created_at.isoformat()
-        ])
-    return response
+    compress = request.GET.get('compress') == 'gzip'
+    etag = make_etag(*tracked_cases_version(request.user).values(), compress)
+    response = not_modified(request, etag)
+    if response is None:
+        qs = Case.objects.filter(trackers__user=request.user)
+        response = case_csv_response(qs, 'my_cases.csv', compress=compress)
+    return set_validators(response, etag)
 
 # Officer/Admin Views
 
+def filter_cases(queryset, params):
+    """Apply the officer list's status and search filters from ``params``."""
+    status = params.get('status')
+    if status in dict(Case.STATUS_CHOICES):
+        queryset = queryset.filter(status=status)
+    query = params.get('q', '').strip()
+    if query:
+        queryset = queryset.filter(Q(ob_number__startswith=query) | Q(title__icontains=query))
+    return queryset
+
+@staff_member_required
+def export_cases_csv(request):
+    """
+    Export all cases matching the officer list filters as a streamed CSV.
+    Pass ?compress=gzip for a gzip-compressed download.
+    """
+    qs = filter_cases(Case.objects.all(), request.GET)
+    return case_csv_response(qs, 'cases.csv', compress=request.GET.get('compress') == 'gzip')
+
+@staff_member_required
+def query_stats_view(request):
+    """
+    Rolling per-view query counts and timings recorded by
+    QueryInstrumentationMiddleware. Empty unless QUERY_INSTRUMENTATION is on.
+    """
+    return JsonResponse({
+        'enabled': getattr(settings, 'QUERY_INSTRUMENTATION', False),
+        'budget': getattr(settings, 'QUERY_BUDGET', 20),
+        'views': query_stats.snapshot(),
+    })
+
+
+@staff_member_required
+def import_cases_view(request):
+    """
+    Upload a CSV or JSON Lines file of cases. Rows are streamed from the
+    upload and written in batches; existing OB numbers are updated unless
+    "skip existing" is ticked. Very large files are better loaded with the
+    import_cases management command, which can resume after interruption.
+    """
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Choose a CSV or JSON Lines file to import.')
+        else:
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            importer = CaseImporter(update_existing=not request.POST.get('skip_existing'))
+            try:
+                result = importer.run(read_rows(stream, detect_format(upload.name)))
+            except (UnicodeDecodeError, csv.Error) as exc:
+                messages.error(request, f'Could not read {upload.name}: {exc}')
+            else:
+                messages.success(
+                    request,
+                    f'{result.created} case(s) created, {result.updated} updated, {result.error_count} rejected.',
+                )
+    return render(request, 'cases/case_import.html', {'result': result, 'errors': result.errors[:100] if result else []})
+
+
+@staff_member_required
+def court_calendar_view(request):
+    """Hearings on one day (default today), grouped by court, optionally for a single court."""
+    day = parse_date(request.GET.get('date') or '') or timezone.localdate()
+    court = request.GET.get('court', '').strip()
+    start, end = day_bounds(day)
+    return render(request, 'cases/court_calendar.html', {
+        'day': day,
+        'previous_day': day - timedelta(days=1),
+        'next_day': day + timedelta(days=1),
+        'court': court,
+        'hearings': hearings(start, end, court=court),
+        'courts': Case.objects.exclude(court='').order_by('court').values_list('court', flat=True).distinct(),
+    })
+
+
+@staff_member_required
+def report_triage_view(request):
+    """Anonymous reports, newest first; exact duplicates show as one row with a count."""
+    reports = AnonymousReport.objects.only('pk', 'details', 'duplicate_count', 'created_at', 'last_reported_at')
+    page = KeysetPaginator(reports, field='created_at', per_page=25).page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return render(request, 'cases/report_triage.html', {'page': page, 'reports': page.object_list})
+
+
 class CaseListView(ListView):
     model = Case
     template_name = 'cases/case_list.html'
     context_object_name = 'cases'
-    ordering = ['-created_at']
+    page_size = 25
+
+    def get_queryset(self):
+        # Only the columns the table renders; ordering comes from the paginator
+        queryset = Case.objects.only('pk', 'ob_number', 'title', 'status', 'created_at').with_note_count()
+        return filter_cases(queryset, self.request.GET)
 
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        qs = Case.objects.all()
-        context['case_counts'] = {
-            'total': qs.count(),
-            'investigation': qs.filter(status='investigation').count(),
-            'dci': qs.filter(status='dci').count(),
-            'court': qs.filter(status='court').count(),
-            'judgement': qs.filter(status='judgement').count()
-        }
+        page = KeysetPaginator(self.object_list, field='created_at', per_page=self.page_size).page(
+            after=self.request.GET.get('after'),
+            before=self.request.GET.get('before'),
+        )
+        kwargs['page'] = page
+        context = super().get_context_data(object_list=page.object_list, **kwargs)
+        context['case_counts'] = global_status_counts()
+        context['status_choices'] = Case.STATUS_CHOICES
+        context['selected_status'] = self.request.GET.get('status', '')
+        context['query'] = self.request.GET.get('q', '')
         return context
 
 class CaseCreateView(CreateView):
     model = Case
-    fields = ['ob_number', 'title', 'description', 'status', 'court_date', 'id_number']
+    fields = ['ob_number', 'title', 'description', 'status', 'court_date', 'court', 'id_number']
     template_name = 'cases/case_form.html'
     success_url = reverse_lazy('case_list')
 
@@ -222,31 +399,18 @@ class CaseCreateView(CreateView):
 
 class CaseUpdateView(UpdateView):
     model = Case
-    fields = ['title', 'description', 'status', 'court_date']
+    fields = ['title', 'description', 'status', 'court_date', 'court']
     template_name = 'cases/case_form.html'
     success_url = reverse_lazy('case_list')
 
     def form_valid(self, form):
-        original = Case.objects.get(pk=self.object.pk)
+        # The form has applied its values to the loaded case; only the
+        # changed columns are written and transitions go into the history
+        self.object = form.instance
+        user = self.request.user
+        save_case(self.object, user=user if user.is_authenticated else None)
         messages.success(self.request, 'Case updated successfully.')
-        response = super().form_valid(form)
-        case = self.object
-        subject_parts = []
-        body_parts = [f"Case {case.ob_number} - {case.title} has been updated."]
-
-        if case.status != original.status:
-            subject_parts.append("status change")
-            body_parts.append(f"New status: {case.get_status_display()}")
-        if case.court_date != original.court_date:
-            subject_parts.append("court date update")
-            new_date = case.court_date.isoformat() if case.court_date else "Removed"
-            body_parts.append(f"Court date: {new_date}")
-
-        if subject_parts:
-            subject = f"HakiFlow: {case.ob_number} {' & '.join(subject_parts)}"
-            send_case_notifications(case, subject, "\n".join(body_parts))
-
-        return response
+        return redirect(self.get_success_url())
 
 class OfficerNoteCreateView(CreateView):
     model = OfficerNote
@@ -260,7 +424,8 @@ class OfficerNoteCreateView(CreateView):
         response = super().form_valid(form)
         subject = f"HakiFlow: New note on {case.ob_number}"
         body = f"A new note was added to case {case.ob_number} - {case.title}:\n\n{form.instance.note}"
-        send_case_notifications(case, subject, body)
+        queue_case_notification(case, subject, body)
+        events.publish_note(form.instance)
         return response
 
     def get_success_url(self):
@@ -277,14 +442,20 @@ class NotificationManagementView(LoginRequiredMixin, TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['subscriptions'] = NotificationSubscription.objects.filter(email=self.request.user.email)
+        context['subscriptions'] = NotificationSubscription.objects.with_case().filter(email=self.request.user.email)
+        context['frequency_choices'] = NotificationSubscription.FREQUENCY_CHOICES
         return context
 
     def post(self, request, *args, **kwargs):
-        # Unsubscribe logic: expect 'subscription_id' in POST
+        # Unsubscribe, or change the delivery frequency when 'frequency' is posted
         subscription_id = request.POST.get('subscription_id')
         subscription = NotificationSubscription.objects.filter(id=subscription_id, email=request.user.email).first()
-        if subscription:
+        frequency = request.POST.get('frequency')
+        if subscription and frequency in dict(NotificationSubscription.FREQUENCY_CHOICES):
+            subscription.frequency = frequency
+            subscription.save(update_fields=['frequency'])
+            messages.success(request, f'Updates for {subscription.case.ob_number} will be sent {subscription.get_frequency_display().lower()}.')
+        elif subscription and not frequency:
             subscription.delete()
             messages.success(request, 'Unsubscribed successfully.')
         else:
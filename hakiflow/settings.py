@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "cases.middleware.QueryInstrumentationMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -89,6 +90,37 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# "case_pages" holds rendered case detail fragments (cases/cache.py). Pages
+# are checked against Case.updated_at before being served, so writes from
+# other processes are never missed; the file-based backend lets several
+# worker processes share the rendered pages instead of each rendering its own.
+
+CASE_PAGE_CACHE_BACKEND = os.getenv("CASE_PAGE_CACHE_BACKEND", "locmem")
+CASE_PAGE_CACHE_TIMEOUT = int(os.getenv("CASE_PAGE_CACHE_TIMEOUT", 24 * 60 * 60))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "case_pages": (
+        {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CASE_PAGE_CACHE_DIR", str(BASE_DIR / ".cache" / "case_pages")),
+            "OPTIONS": {"MAX_ENTRIES": 50000},
+        }
+        if CASE_PAGE_CACHE_BACKEND == "file"
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "case_pages",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    ),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -140,4 +172,16 @@ EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "True").lower() == "true"
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
-DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
\ No newline at end of file
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
+
+# Per-request SQL instrumentation (Server-Timing headers, /ops/query-stats/)
+QUERY_INSTRUMENTATION = os.getenv("QUERY_INSTRUMENTATION", "False").lower() == "true"
+# Log a warning when a view runs more queries than this; per-view overrides by URL name
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 20))
+QUERY_BUDGETS = {}
+
+# Per-IP rate limits on public endpoints (see cases.ratelimit). "memory" keeps
+# counters per process; "cache" shares them through the default cache.
+RATELIMIT_STORE = os.getenv("RATELIMIT_STORE", "memory")
+# Number of trusted proxies appending to X-Forwarded-For in front of the app
+RATELIMIT_PROXY_COUNT = int(os.getenv("RATELIMIT_PROXY_COUNT", 0))
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hakiflow.settings")
 
 application = get_wsgi_application()
+
+# Build the OB number filter in the background rather than in the first lookup
+from cases.lookup import ob_numbers  # noqa: E402
+
+ob_numbers.warm()